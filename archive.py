@@ -0,0 +1,193 @@
+from array import array
+from transaction import Transaction, pack_b64, unpack_b64
+
+# A number column keeps floats and ints in one array of doubles; ints that
+# a double cannot hold exactly go to a side table so the type round-trips.
+class NumberColumn:
+    def __init__(self):
+        self.values = array("d")
+        self.is_int = bytearray()
+        self.overflow = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        i = len(self.values)
+        as_float = float(value)
+        if isinstance(value, int) and int(as_float) != value:
+            self.overflow[i] = value
+        self.values.append(as_float)
+        self.is_int.append(isinstance(value, int))
+
+    def __getitem__(self, i):
+        if i in self.overflow:
+            return self.overflow[i]
+        value = self.values[i]
+        return int(value) if self.is_int[i] else value
+
+    def truncate(self, length):
+        del self.values[length:]
+        del self.is_int[length:]
+        self.overflow = {i: v for i, v in self.overflow.items() if i < length}
+
+# Fixed-size byte strings (hashes, keys, signatures) packed back to back;
+# values that are not canonical, including None, go to a side table.
+class BytesColumn:
+    def __init__(self, size, pack, unpack):
+        self.size = size
+        self.pack = pack
+        self.unpack = unpack
+        self.data = bytearray()
+        self.count = 0
+        self.irregular = {}
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        raw = self.pack(value)
+        if isinstance(raw, bytes) and len(raw) == self.size:
+            self.data += raw
+        else:
+            self.data += bytes(self.size)
+            self.irregular[self.count] = value
+        self.count += 1
+
+    def __getitem__(self, i):
+        if i in self.irregular:
+            return self.irregular[i]
+        return self.unpack(bytes(self.data[i * self.size:(i + 1) * self.size]))
+
+    def truncate(self, length):
+        del self.data[length * self.size:]
+        self.count = min(self.count, length)
+        self.irregular = {i: v for i, v in self.irregular.items() if i < length}
+
+def pack_hex(value):
+    try:
+        raw = bytes.fromhex(value)
+    except (TypeError, ValueError):
+        return value
+    return raw if raw.hex() == value else value
+
+def unpack_hex(raw):
+    return raw.hex()
+
+def pack_target(target):
+    return target.to_bytes(32, "big")
+
+def unpack_target(raw):
+    return int.from_bytes(raw, "big")
+
+# Addresses repeat across many transactions, so each distinct one is stored
+# once and transactions refer to it by number.
+class AddressTable:
+    def __init__(self):
+        self.ids = {}
+        self.addresses = []
+
+    def intern(self, address):
+        packed = pack_b64(address, 32)
+        i = self.ids.get(packed)
+        if i is None:
+            i = self.ids[packed] = len(self.addresses)
+            self.addresses.append(packed)
+        return i
+
+    def __getitem__(self, i):
+        return unpack_b64(self.addresses[i])
+
+# Columnar, array-backed layout for archival blocks. Blocks are rebuilt on
+# access, so a fully loaded chain costs a few arrays instead of millions of
+# small objects. The previous hash is not stored when it links to the block
+# before, which is every block except the genesis. Pruned blocks come
+# first in the chain, so their Merkle roots are a column of their own.
+class BlockArchive:
+    def __init__(self, make_block):
+        self.make_block = make_block
+        self.addresses = AddressTable()
+        self.clear()
+
+    def clear(self):
+        self.indexes = array("q")
+        self.versions = array("B")
+        self.nonces = array("Q")
+        self.timestamps = NumberColumn()
+        self.hashes = BytesColumn(32, pack_hex, unpack_hex)
+        self.targets = BytesColumn(32, pack_target, unpack_target)
+        self.pruned_roots = BytesColumn(32, pack_hex, unpack_hex)
+        self.unlinked = {}
+        self.tx_starts = array("Q", [0])
+        self.senders = array("I")
+        self.recipients = array("I")
+        self.amounts = NumberColumn()
+        self.fees = NumberColumn()
+        self.signatures = BytesColumn(64, lambda value: pack_b64(value, 64), unpack_b64)
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def append(self, block):
+        i = len(self)
+        if i == 0 or self.hashes[i - 1] != block.previous_hash:
+            self.unlinked[i] = block.previous_hash
+        self.indexes.append(block.index)
+        self.versions.append(block.version)
+        self.nonces.append(block.nonce)
+        self.timestamps.append(block.timestamp)
+        self.hashes.append(block.hash)
+        self.targets.append(block.target)
+        if block.pruned and len(self.pruned_roots) == i:
+            self.pruned_roots.append(block.merkle_root)
+        for tx in block.transaction:
+            self.senders.append(self.addresses.intern(tx.sender))
+            self.recipients.append(self.addresses.intern(tx.recipient))
+            self.amounts.append(tx.amount)
+            self.fees.append(tx.fee)
+            self.signatures.append(tx.signature)
+        self.tx_starts.append(len(self.senders))
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError("block index out of range")
+        transactions = [
+            Transaction(
+                sender=self.addresses[self.senders[j]],
+                recipient=self.addresses[self.recipients[j]],
+                amount=self.amounts[j],
+                signature=self.signatures[j],
+                fee=self.fees[j]
+            )
+            for j in range(self.tx_starts[i], self.tx_starts[i + 1])
+        ]
+        return self.make_block(
+            index=self.indexes[i],
+            timestamp=self.timestamps[i],
+            transaction=transactions,
+            previous_hash=self.unlinked[i] if i in self.unlinked else self.hashes[i - 1],
+            nonce=self.nonces[i],
+            version=self.versions[i],
+            block_hash=self.hashes[i],
+            target=self.targets[i],
+            pruned_root=self.pruned_roots[i] if i < len(self.pruned_roots) else None
+        )
+
+    def truncate(self, length):
+        if length >= len(self):
+            return
+        tx_count = self.tx_starts[length]
+        del self.indexes[length:]
+        del self.versions[length:]
+        del self.nonces[length:]
+        self.timestamps.truncate(length)
+        self.hashes.truncate(length)
+        self.targets.truncate(length)
+        self.pruned_roots.truncate(length)
+        self.unlinked = {i: v for i, v in self.unlinked.items() if i < length}
+        del self.tx_starts[length + 1:]
+        del self.senders[tx_count:]
+        del self.recipients[tx_count:]
+        self.amounts.truncate(tx_count)
+        self.fees.truncate(tx_count)
+        self.signatures.truncate(tx_count)
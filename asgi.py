@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import uvicorn
+import config
+import node
+from mining import start_pool
+from async_peers import AsyncGossip, LoopTransport
+
+# Async serving mode: python asgi.py [port]. Uvicorn holds the connections
+# on one event loop, which also does all peer I/O; the Flask routes in
+# node.py are served unchanged on a pool of handler threads.
+
+handler_pool = ThreadPoolExecutor(config.SERVER_THREADS)
+
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+# Runs the Flask app on the handler pool. The response is pulled from it
+# one chunk at a time, so streamed responses such as /chain stay streamed.
+# Each step may land on a different thread, so all of them run in one
+# context of their own, where Flask's request context was pushed.
+async def wsgi_bridge(scope, receive, send):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    def first_chunk():
+        chunks = iter(node.app(wsgi_environ(scope, bytes(body)), start_response))
+        return chunks, next(chunks, None)
+
+    chunks, chunk = await loop.run_in_executor(handler_pool, context.run, first_chunk)
+    try:
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        while chunk is not None:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await loop.run_in_executor(handler_pool, context.run, next, chunks, None)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(chunks, "close"):
+            await loop.run_in_executor(handler_pool, context.run, chunks.close)
+
+transport = node.transport = LoopTransport()
+gossip = node.gossip = AsyncGossip(config.PEER_TIMEOUT, config.GOSSIP_SEEN_SIZE, config.GOSSIP_MAX_BACKOFF,
+                                   health=node.peers)
+client = None
+
+async def lifespan(receive, send):
+    global client
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            client = httpx.AsyncClient(timeout=config.PEER_TIMEOUT,
+                                       limits=httpx.Limits(max_connections=config.PEER_MAX_CONNECTIONS))
+            transport.start(asyncio.get_running_loop(), client)
+            gossip.start(asyncio.get_running_loop(), client)
+            threading.Thread(target=node.join_network, daemon=True).start()
+            threading.Thread(target=node.probe_peers, daemon=True).start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(None, node.miner.stop)
+            await client.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http":
+        await wsgi_bridge(scope, receive, send)
+
+if __name__ == "__main__":
+    start_pool(os.cpu_count() or 1)
+    uvicorn.run(app, host="0.0.0.0", port=node.PORT, backlog=config.SERVER_BACKLOG, log_level="warning")
@@ -0,0 +1,118 @@
+import asyncio
+import time
+import httpx
+import codec
+import metrics
+from gossip import Gossip
+
+# Peer I/O for the ASGI server. Requests run on the server's event loop over
+# one pooled HTTP client, so waiting on a slow peer holds a connection
+# rather than a thread. The sync flow and peer management in sync.py and
+# peermanager.py call this from worker threads like any other transport.
+
+# The HttpTransport interface, with each call handed to the loop and waited
+# on from the calling thread. It must not be called from the loop itself.
+class LoopTransport:
+    def __init__(self):
+        self.loop = None
+        self.client = None
+
+    def start(self, loop, client):
+        self.loop = loop
+        self.client = client
+
+    def call(self, coroutine):
+        if self.loop is None:
+            coroutine.close()
+            raise RuntimeError("the transport is not started")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def fetch_json(self, peer, path, params):
+        response = await self.client.get(f"{peer}{path}", params=params)
+        response.raise_for_status()
+        metrics.SYNC_BYTES.inc(len(response.content))
+        return response.json()
+
+    async def send_json(self, peer, path, data):
+        response = await self.client.post(f"{peer}{path}", json=data)
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch_ping(self, peer):
+        (await self.client.get(f"{peer}/ping")).raise_for_status()
+
+    def get_json(self, peer, path, params=None):
+        return self.call(self.fetch_json(peer, path, params))
+
+    def post_json(self, peer, path, data):
+        return self.call(self.send_json(peer, path, data))
+
+    def ping(self, peer):
+        self.call(self.fetch_ping(peer))
+
+    # Chunks are read on the loop and split into frames here, so a range
+    # costs one hop between threads per chunk rather than per block.
+    def stream_frames(self, peer, path, params):
+        if self.loop is None:
+            raise RuntimeError("the transport is not started")
+        stream = self.client.stream("GET", f"{peer}{path}", params=params, headers={"Accept": codec.MIME_TYPE})
+
+        async def next_chunk(chunks):
+            try:
+                return await chunks.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        response = self.call(stream.__aenter__())
+        try:
+            response.raise_for_status()
+            chunks = response.aiter_bytes()
+            buffer = bytearray()
+            while True:
+                chunk = self.call(next_chunk(chunks))
+                if chunk is None:
+                    break
+                metrics.SYNC_BYTES.inc(len(chunk))
+                buffer += chunk
+                while (payload := codec.split_frame(buffer)) is not None:
+                    yield payload
+            if buffer:
+                raise ValueError("stream ended inside a frame")
+        finally:
+            self.call(stream.__aexit__(None, None, None))
+
+# Same seen-set and backoff as Gossip; only the transport differs. Request
+# handlers run in worker threads, so sends are handed to the loop. Until
+# the server has started its loop, sends go through Gossip's thread pool.
+class AsyncGossip(Gossip):
+    def __init__(self, timeout, seen_size, max_backoff, health=None):
+        super().__init__(1, timeout, seen_size, max_backoff, health)
+        self.loop = None
+        self.client = None
+
+    def start(self, loop, client):
+        self.loop = loop
+        self.client = client
+
+    def broadcast(self, peers, path, data):
+        if self.loop is None:
+            return super().broadcast(peers, path, data)
+        futures = []
+        for peer in list(peers):
+            if self.available(peer):
+                futures.append(asyncio.run_coroutine_threadsafe(self.send_async(peer, path, data), self.loop))
+        return futures
+
+    async def send_async(self, peer, path, data):
+        start = time.perf_counter()
+        try:
+            if isinstance(data, bytes):
+                response = await self.client.post(f"{peer}{path}", content=data,
+                                                  headers={"Content-Type": codec.MIME_TYPE})
+            else:
+                response = await self.client.post(f"{peer}{path}", json=data)
+        except httpx.HTTPError as e:
+            self.record_failure(peer, e)
+            return None
+        self.record_success(peer, time.perf_counter() - start)
+        return response.status_code
@@ -0,0 +1,231 @@
+import argparse
+import cProfile
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import config
+from collections import deque
+from blockchain import Blockchain, Block, difficulty_target, header_is_valid
+from transaction import Transaction, verify_batch, clear_verified_cache
+from wallet import generate_keypair, get_address_from_public_key
+from sync import block_matches_header
+
+# Every benchmark returns {name: (value, unit, higher_is_better)}. Chains are
+# synthetic and built in a temporary directory, so nothing touches the
+# node's own chain files or the network. Their blocks are one second apart
+# and mined at difficulty 1 with a one second target, so they stay valid
+# without costing real proof-of-work.
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def make_keys(count):
+    keys = [generate_keypair()[0] for _ in range(count)]
+    return [(key, get_address_from_public_key(key.public_key())) for key in keys]
+
+def make_transactions(keys, count, rng):
+    txs = []
+    for _ in range(count):
+        key, sender = rng.choice(keys)
+        tx = Transaction(sender, rng.choice(keys)[1], rng.randint(1, 100), fee=rng.choice([0, 1]))
+        tx.sign(key)
+        txs.append(tx)
+    return txs
+
+def make_chain(blockchain, height, txs_per_block, keys, rng):
+    while len(blockchain.chain) < height:
+        txs = make_transactions(keys, txs_per_block, rng)
+        txs.append(Transaction("SYSTEM", rng.choice(keys)[1], blockchain.mining_reward))
+        latest = blockchain.chain[-1]
+        block = Block(latest.index + 1, latest.timestamp + 1, txs, latest.hash, target=blockchain.next_target())
+        blockchain.proof_of_work(block, 1)
+        blockchain.append_block(block)
+    blockchain.publish_tip()
+    return blockchain
+
+def fresh_blockchain(workdir, name, difficulty=1):
+    config.BLOCKS_FILE = os.path.join(workdir, f"{name}.dat")
+    config.CHAIN_FILE = os.path.join(workdir, f"{name}.json")
+    config.TX_INDEX_FILE = os.path.join(workdir, f"{name}.db")
+    config.SNAPSHOT_FILE = os.path.join(workdir, f"{name}.snapshot.json")
+    config.INITIAL_DIFFICULTY = difficulty
+    config.TARGET_BLOCK_TIME = 1
+    return Blockchain()
+
+def bench_proof_of_work(args, workdir, keys, rng):
+    results = {}
+    for workers in sorted({1, args.workers}):
+        blockchain = fresh_blockchain(workdir, f"pow{workers}", args.difficulty)
+        rates = []
+        for _ in range(args.pow_rounds):
+            block = Block(1, time.time(), make_transactions(keys, 10, rng), blockchain.get_latest_block().hash,
+                          target=difficulty_target(args.difficulty))
+            blockchain.proof_of_work(block, workers)
+            rates.append(blockchain.hash_rate)
+        results[f"pow.hash_rate.workers_{workers}"] = (sum(rates) / len(rates), "H/s", True)
+    return results
+
+def bench_calculate_hash(args, workdir, keys, rng):
+    results = {}
+    for size in args.block_sizes:
+        txs = make_transactions(keys, size, rng)
+        for version in (1, 3):
+            block = Block(1, time.time(), txs, "0" * 64, version=version)
+            cost = timed(lambda: Block(1, block.timestamp, txs, block.previous_hash, version=version), args.repeat)
+            results[f"calculate_hash.v{version}.txs_{size}"] = (cost * 1e6, "us", False)
+        hasher = block.nonce_hasher()
+        results[f"nonce_hash.txs_{size}"] = (timed(lambda: hasher(12345), args.repeat * 100) * 1e6, "us", False)
+    return results
+
+def bench_balance(args, workdir, keys, rng):
+    results = {}
+    address = keys[0][1]
+    blockchain = fresh_blockchain(workdir, "balance")
+    for height in args.heights:
+        make_chain(blockchain, height, args.txs_per_block, keys, rng)
+        blockchain._ledger = None
+        results[f"get_balance.cold.height_{height}"] = (timed(lambda: blockchain.get_balance(address)) * 1e3, "ms", False)
+        results[f"get_balance.warm.height_{height}"] = (timed(lambda: blockchain.get_balance(address), args.repeat) * 1e6, "us", False)
+    return results
+
+def bench_storage(args, workdir, keys, rng):
+    height = max(args.heights)
+    blockchain = make_chain(fresh_blockchain(workdir, "storage"), height, args.txs_per_block, keys, rng)
+    path = os.path.join(workdir, "export.json")
+    results = {
+        f"chain_json.save.height_{height}": (timed(lambda: blockchain.save_chain_to_file(path)) * 1e3, "ms", False),
+        f"chain_json.load.height_{height}": (timed(lambda: blockchain.load_chain_from_file(path)) * 1e3, "ms", False),
+        "chain_json.bytes_per_block": (os.path.getsize(path) / height, "B", False),
+        "block_store.bytes_per_block": (os.path.getsize(config.BLOCKS_FILE) / height, "B", False)
+    }
+    blockchain.store.close()
+    results[f"block_store.open.height_{height}"] = (timed(lambda: fresh_blockchain(workdir, "storage").store.close()) * 1e3, "ms", False)
+    return results
+
+def bench_signatures(args, workdir, keys, rng):
+    txs = make_transactions(keys, args.signatures, rng)
+    clear_verified_cache()
+    sequential = timed(lambda: [tx.is_valid() for tx in txs])
+    clear_verified_cache()
+    batch = timed(lambda: verify_batch(txs))
+    cached = timed(lambda: verify_batch(txs))
+    return {
+        "verify.sequential": (len(txs) / sequential, "sig/s", True),
+        "verify.batch": (len(txs) / batch, "sig/s", True),
+        "verify.cached": (len(txs) / cached, "sig/s", True)
+    }
+
+# Runs the same checks sync applies to a peer's headers and bodies, minus
+# the HTTP transfer.
+def bench_sync_validation(args, workdir, keys, rng):
+    height = max(args.heights)
+    blockchain = make_chain(fresh_blockchain(workdir, "sync"), height, args.txs_per_block, keys, rng)
+    blocks = [Block.from_bytes(block.to_bytes()) for block in blockchain.chain]
+    headers = [block.header_dict() for block in blocks]
+
+    def validate_headers():
+        window = deque([(blocks[0].timestamp, blocks[0].target)], maxlen=config.RETARGET_WINDOW + 1)
+        for previous, header in zip(headers, headers[1:]):
+            assert header_is_valid(header, previous, list(window))
+            window.append((header["timestamp"], int(header["target"], 16)))
+
+    def validate_bodies():
+        for block, header in zip(blocks[1:], headers[1:]):
+            assert block_matches_header(block, header)
+
+    clear_verified_cache()
+    return {
+        f"sync.headers.height_{height}": (timed(validate_headers) * 1e3, "ms", False),
+        f"sync.bodies.height_{height}": (timed(validate_bodies) * 1e3, "ms", False)
+    }
+
+BENCHMARKS = {
+    "pow": bench_proof_of_work,
+    "hash": bench_calculate_hash,
+    "balance": bench_balance,
+    "storage": bench_storage,
+    "signatures": bench_signatures,
+    "sync": bench_sync_validation
+}
+
+def run(args):
+    rng = random.Random(args.seed)
+    keys = make_keys(8)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.only or BENCHMARKS:
+            print(f"[i] Running {name}...", file=sys.stderr)
+            for metric, (value, unit, higher_is_better) in BENCHMARKS[name](args, workdir, keys, rng).items():
+                results[metric] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for metric, current in results.items():
+        previous = baseline.get(metric)
+        if not previous or not previous["value"]:
+            continue
+        change = current["value"] / previous["value"] - 1
+        worse = -change if current["higher_is_better"] else change
+        current["baseline"] = previous["value"]
+        current["change"] = change
+        if worse > threshold:
+            regressions.append(metric)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HaniCoin benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--quick", action="store_true", help="Smaller chains and fewer rounds")
+    parser.add_argument("--difficulty", type=int, default=4, help="Proof-of-work difficulty")
+    parser.add_argument("--workers", type=int, default=config.MINING_WORKERS, help="Parallel mining workers")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic chains")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--profile", help="Write cProfile stats for the whole run to this file")
+    args = parser.parse_args()
+
+    args.pow_rounds = 1 if args.quick else 3
+    args.repeat = 20 if args.quick else 200
+    args.block_sizes = [1, 10, 100] if args.quick else [1, 10, 100, 1000]
+    args.heights = [10, 100] if args.quick else [100, 1000, 5000]
+    args.txs_per_block = 2 if args.quick else 5
+    args.signatures = 200 if args.quick else 2000
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    results = run(args)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+
+    report = {
+        "created": time.time(),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "results": results,
+        "regressions": regressions
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+    for metric in regressions:
+        change = results[metric]["change"]
+        print(f"[!] Regression in {metric}: {change:+.1%}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
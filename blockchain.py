@@ -1,19 +1,154 @@
 import hashlib
 import json
 import time
-from transaction import Transaction
+from collections import deque, namedtuple
+import codec
+from transaction import Transaction, merkle_root
+from mining import parallel_proof_of_work, CHECK_EVERY
+from ledger import BalanceLedger
+from snapshot import Snapshot
+from txindex import TxIndex
+from mempool import Mempool
+from storage import BlockStore, LazyChain
+from archive import BlockArchive
+from locks import ReadWriteLock
+import config
+import metrics
+import validation
 import os
 
+# Version 1 hashes the whole block as sorted JSON (the original format).
+# Version 2 hashes a fixed header that commits to the transactions through
+# a single digest, so only the nonce changes between proof-of-work attempts.
+# Version 3 commits to the Merkle root of the transaction ids instead, so a
+# light client can check inclusion of one transaction against the header.
+# Version 4 also commits to a 256-bit target set by retargeting; earlier
+# versions were all mined against the fixed four-hex-zero target.
+BLOCK_VERSION = 4
+
+def difficulty_target(zeros):
+    return 16 ** (64 - zeros) - 1
+
+LEGACY_TARGET = difficulty_target(4)
+
+# Every node builds the same genesis block, so two fresh nodes share a fork
+# point and headers-first sync can connect them. The timestamp is that of
+# the genesis block in the original chain.json.
+GENESIS_TIMESTAMP = 1751756133.401991
+MAX_TARGET = difficulty_target(1)
+
+# Expected number of hashes needed to meet the target.
+def block_work(target):
+    return (1 << 256) // (target + 1)
+
+def target_hex(target):
+    return f"{target:064x}"
+
+def meets_target(block_hash, target):
+    return len(block_hash) == 64 and block_hash <= target_hex(target)
+
+# The target of the next block scales the average target of the window by
+# how long the window actually took against TARGET_BLOCK_TIME per block,
+# moving at most 4x either way. Each interval counts for at most
+# MAX_INTERVAL_BLOCKS block times, so one long gap (such as the one after
+# the fixed genesis) cannot push every target in the window easier and
+# compound through the average. Integer millisecond maths keeps every
+# node on exactly the same result.
+MAX_INTERVAL_BLOCKS = 6
+
+def retarget(window):
+    if len(window) < 2:
+        return window[-1][1]
+    intervals = len(window) - 1
+    block_time = int(config.TARGET_BLOCK_TIME * 1000)
+    expected = intervals * block_time
+    span = sum(
+        min(max(int((later - earlier) * 1000), 0), MAX_INTERVAL_BLOCKS * block_time)
+        for (earlier, _), (later, _) in zip(window, window[1:])
+    )
+    span = min(max(span, expected // 4), expected * 4)
+    average = sum(target for _, target in window[1:]) // intervals
+    return min(max(average * span // expected, 1), MAX_TARGET)
+
+# Retargeting is driven by timestamps, so a block must be later than the
+# median of the window and no more than MAX_FUTURE_DRIFT seconds ahead of
+# our clock.
+def timestamp_is_valid(timestamp, window):
+    if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool):
+        return False
+    times = sorted(stamp for stamp, _ in window)
+    if times and timestamp <= times[len(times) // 2]:
+        return False
+    return timestamp <= time.time() + config.MAX_FUTURE_DRIFT
+
+# window holds (timestamp, target) of the blocks before this one, oldest
+# first, as returned by Blockchain.retarget_window.
+def header_is_valid(header, previous, window):
+    if header["index"] != previous["index"] + 1 or header["previous_hash"] != previous["hash"]:
+        return False
+    if header["version"] < previous["version"]:
+        return False
+    if not timestamp_is_valid(header["timestamp"], window):
+        return False
+    target = int(header["target"], 16)
+    if header["version"] >= 4 and target != retarget(window):
+        return False
+    if header["version"] < 4 and target != LEGACY_TARGET:
+        return False
+    if not meets_target(header["hash"], target):
+        return False
+    if header["version"] >= 3 and calculate_header_hash(header) != header["hash"]:
+        return False
+    return True
+
+def header_prefix(version, index, timestamp, previous_hash, commitment, target):
+    prefix = f"{version}|{index}|{timestamp!r}|{previous_hash}|{commitment}|"
+    if version >= 4:
+        prefix += f"{target_hex(target)}|"
+    return prefix.encode()
+
+def calculate_header_hash(header):
+    state = hashlib.sha256(header_prefix(
+        header["version"],
+        header["index"],
+        header["timestamp"],
+        header["previous_hash"],
+        header["merkle_root"],
+        int(header["target"], 16)
+    ))
+    state.update(str(header["nonce"]).encode())
+    return state.hexdigest()
+
 class Block:
-    def __init__(self, index, timestamp, transaction, previous_hash, nonce=0):
+    __slots__ = ("index", "timestamp", "transaction", "previous_hash", "nonce", "version", "target", "_merkle_root", "pruned", "hash")
+    
+    # A pruned block has dropped its transactions and keeps only the header,
+    # with the Merkle root passed in as pruned_root.
+    def __init__(self, index, timestamp, transaction, previous_hash, nonce=0, version=BLOCK_VERSION, block_hash=None, target=None, pruned_root=None):
         self.index = index
         self.timestamp = timestamp
         self.transaction = transaction
         self.previous_hash = previous_hash
         self.nonce = nonce
-        self.hash = self.calculate_hash()
+        self.version = version
+        self.target = LEGACY_TARGET if target is None else target
+        self._merkle_root = pruned_root
+        self.pruned = pruned_root is not None
+        self.hash = block_hash or self.calculate_hash()
         
+    # Versions before 3 hash the transactions themselves, so without them
+    # only the stored hash is left.
+    @metrics.timed(metrics.BLOCK_HASH_SECONDS)
     def calculate_hash(self):
+        if self.pruned and self.version < 3:
+            return self.hash
+        if self.version < 2:
+            return self.calculate_legacy_hash()
+        state = self.header_state()
+        state.update(str(self.nonce).encode())
+        return state.hexdigest()
+    
+    def calculate_legacy_hash(self):
         transaction_data = [tx.to_dict() if isinstance(tx, Transaction) else tx for tx in self.transaction]
         block_string = json.dumps({
             "index": self.index,
@@ -24,6 +159,104 @@ class Block:
         }, sort_keys=True).encode()
         return hashlib.sha256(block_string).hexdigest()
     
+    def transactions_digest(self):
+        transaction_data = [
+            tx.to_signed_dict() if isinstance(tx, Transaction) else tx
+            for tx in self.transaction
+        ]
+        return hashlib.sha256(json.dumps(transaction_data, sort_keys=True).encode()).hexdigest()
+    
+    @property
+    def merkle_root(self):
+        if self._merkle_root is None:
+            self._merkle_root = merkle_root([tx.txid for tx in self.transaction])
+        return self._merkle_root
+    
+    def header_state(self):
+        commitment = self.merkle_root if self.version >= 3 else self.transactions_digest()
+        return hashlib.sha256(header_prefix(self.version, self.index, self.timestamp, self.previous_hash, commitment, self.target))
+    
+    def header_dict(self):
+        return {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root,
+            "nonce": self.nonce,
+            "version": self.version,
+            "target": target_hex(self.target),
+            "hash": self.hash
+        }
+    
+    def nonce_hasher(self):
+        if self.version < 2:
+            def legacy_hasher(nonce):
+                self.nonce = nonce
+                return self.calculate_legacy_hash()
+            return legacy_hasher
+        
+        state = self.header_state()
+        def hasher(nonce):
+            attempt = state.copy()
+            attempt.update(str(nonce).encode())
+            return attempt.hexdigest()
+        return hasher
+    
+    def to_dict(self):
+        data = {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "transactions": [
+                tx.to_signed_dict() if isinstance(tx, Transaction) else tx
+                for tx in self.transaction
+            ],
+            "previous_hash": self.previous_hash,
+            "nonce": self.nonce,
+            "version": self.version,
+            "hash": self.hash
+        }
+        if self.version >= 4:
+            data["target"] = target_hex(self.target)
+        if self.pruned:
+            data["pruned_root"] = self.merkle_root
+        return data
+    
+    # Only the local store may hand back pruned blocks; anything from the
+    # network must carry the transactions its hash commits to.
+    @classmethod
+    def from_dict(cls, block_data, allow_pruned=False):
+        if "pruned_root" in block_data and not allow_pruned:
+            raise ValueError("pruned blocks are only read from the local store")
+        return cls(
+            index=block_data["index"],
+            timestamp=block_data["timestamp"],
+            transaction=[Transaction(**tx) for tx in block_data["transactions"]],
+            previous_hash=block_data["previous_hash"],
+            nonce=block_data["nonce"],
+            version=block_data.get("version", 1),
+            block_hash=block_data["hash"],
+            target=int(block_data["target"], 16) if "target" in block_data else None,
+            pruned_root=block_data.get("pruned_root")
+        )
+    
+    def without_body(self):
+        return Block(self.index, self.timestamp, [], self.previous_hash, self.nonce,
+                     self.version, self.hash, self.target, pruned_root=self.merkle_root)
+    
+    def to_bytes(self):
+        return codec.encode_block(self)
+    
+    @classmethod
+    def from_bytes(cls, data, allow_pruned=False):
+        return cls(**codec.decode_block(data, allow_pruned))
+    
+    # Block files written before the binary codec hold JSON records.
+    @classmethod
+    def from_record(cls, payload):
+        if payload[:1] == b"{":
+            return cls.from_dict(json.loads(payload), allow_pruned=True)
+        return cls.from_bytes(payload, allow_pruned=True)
+    
     def __str__(self):
         tx_output = []
         for tx in self.transaction:
@@ -40,21 +273,156 @@ class Block:
             f"Transactions:\n" + "\n".join(f"  {tx}" for tx in tx_output)
         )
 
+# Readers take the tip from an immutable snapshot that each write replaces
+# once it is complete, so they neither wait on the lock nor see a
+# reorganisation half done.
+ChainTip = namedtuple("ChainTip", ["height", "block", "work"])
+
+# Blocks, the ledger and the indexes are changed only under the write side
+# of self.lock; reads that span several blocks take its read side. The
+# mempool has a lock of its own, always taken after this one.
 class Blockchain:
     def __init__(self):
-        if os.path.exists("chain.json"):
-            self.chain = self.load_chain_from_file()
-        else:
-            self.chain = [self.create_genesis_block()]
-        self.pending_transactions = []
-        self.difficulty = 4
+        load_start = time.perf_counter()
+        migrate = not os.path.exists(config.BLOCKS_FILE) and os.path.exists(config.CHAIN_FILE)
+        self.store = BlockStore(config.BLOCKS_FILE, config.FSYNC_EVERY)
+        if migrate:
+            self.store.rewrite(block.to_bytes() for block in self.load_chain_from_file(config.CHAIN_FILE))
+            print(f"[i] Migrated {len(self.store)} blocks from {config.CHAIN_FILE} to {config.BLOCKS_FILE}")
+            
+        cache_size = config.CHAIN_CACHE_SIZE if config.LAZY_CHAIN else None
+        archive = BlockArchive(Block) if not config.LAZY_CHAIN and config.COLUMNAR_ARCHIVE else None
+        self.chain = LazyChain(self.store, Block.from_record, Block.to_bytes, cache_size, archive)
+        if not len(self.chain):
+            self.chain.append(self.create_genesis_block())
+        self.mempool = Mempool(config.MEMPOOL_MAX_BYTES, config.MEMPOOL_MAX_AGE)
         self.mining_reward = 10
+        self.mining_workers = config.MINING_WORKERS
+        self.hash_rate = 0.0
+        self.lock = ReadWriteLock()
+        self._ledger = None
+        self._work = None
+        self.snapshot = Snapshot.load(config.SNAPSHOT_FILE)
+        self.bootstrap = None
+        self.pruned_height = self.find_pruned_height()
+        self.tx_index = TxIndex(config.TX_INDEX_FILE) if config.TX_INDEX_FILE else None
+        if self.tx_index is not None:
+            self.tx_index.catch_up(self.chain, lambda block: block_work(block.target))
+        self.publish_tip()
+        metrics.CHAIN_LOAD_SECONDS.set(time.perf_counter() - load_start)
+        
+    # The ledger starts from the saved snapshot when it still lies on our
+    # chain, so only the blocks after it are replayed. It is built aside and
+    # then published, as readers may get here at the same time.
+    @property
+    def ledger(self):
+        if self._ledger is None:
+            ledger = BalanceLedger()
+            if self.snapshot_on_chain(self.snapshot):
+                start = self.snapshot.height + 1
+                ledger.restore(self.snapshot.balances, (self.chain[i] for i in range(start, len(self.chain))))
+            else:
+                if self.pruned_height:
+                    print(f"[!] Blocks below {self.pruned_height} are pruned and no snapshot covers them, balances will be wrong")
+                ledger.rebuild(self.chain)
+            self._ledger = ledger
+        return self._ledger
+    
+    def snapshot_on_chain(self, snapshot):
+        return (snapshot is not None and snapshot.height < len(self.chain)
+                and self.chain[snapshot.height].hash == snapshot.block_hash)
+    
+    # Pruned blocks form a prefix of the chain, so the first block that
+    # still has its body is found by bisection.
+    def find_pruned_height(self):
+        low, high = 0, len(self.chain)
+        while low < high:
+            middle = (low + high) // 2
+            if self.chain[middle].pruned:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    # Drops the bodies of blocks more than PRUNE_KEEP_BLOCKS deep, and never
+    # within MAX_REORG_DEPTH of the tip, since reverting a block needs its
+    # transactions. The balances at the new boundary are worked out by
+    # reverting the kept blocks and saved as the snapshot the ledger is
+    # rebuilt from. Runs once SNAPSHOT_INTERVAL more blocks can be pruned,
+    # as the block file is rewritten each time; the rewrite streams, and
+    # only the newly pruned blocks are decoded.
+    def prune(self):
+        if not config.PRUNE_KEEP_BLOCKS:
+            return
+        keep = max(config.PRUNE_KEEP_BLOCKS, config.MAX_REORG_DEPTH + 1)
+        with self.lock:
+            height = len(self.chain) - 1 - keep
+            if height + 1 - self.pruned_height < max(config.SNAPSHOT_INTERVAL, 1):
+                return
+            ledger = BalanceLedger()
+            ledger.balances = dict(self.ledger.balances)
+            for i in range(len(self.chain) - 1, height, -1):
+                ledger.revert_block(self.chain[i])
+            snapshot = Snapshot(height, self.chain[height].hash, ledger.balances)
+            snapshot.save(config.SNAPSHOT_FILE)
+            self.snapshot = snapshot
+            
+            self.chain.rewrite(self.pruned_height, height + 1, lambda block: block.without_body())
+            self.pruned_height = height + 1
+            print(f"[i] Pruned block bodies below height {self.pruned_height}")
+            
+    def take_snapshot(self):
+        latest = self.chain[-1]
+        self.snapshot = Snapshot(latest.index, latest.hash, dict(self.ledger.balances))
+        self.snapshot.save(config.SNAPSHOT_FILE)
+        
+    # Balances from a peer's snapshot are served until our own chain reaches
+    # its height; the snapshot is then checked against the replayed ledger.
+    def install_snapshot(self, snapshot):
+        with self.lock:
+            if snapshot.height < len(self.chain):
+                return False
+            self.bootstrap = snapshot
+            return True
+        
+    def check_bootstrap(self, block):
+        snapshot = self.bootstrap
+        if snapshot is None or block.index != snapshot.height:
+            return
+        self.bootstrap = None
+        balances = Snapshot(block.index, block.hash, self.ledger.balances)
+        if balances.hash != snapshot.hash:
+            print(f"[!] Snapshot at height {snapshot.height} does not match the replayed chain, discarding it")
+            return
+        self.snapshot = snapshot
+        snapshot.save(config.SNAPSHOT_FILE)
+        print(f"[√] Snapshot at height {snapshot.height} verified against the replayed chain")
+    
+    # Read from the index when there is one; otherwise every block has to
+    # be decoded once.
+    @property
+    def total_work(self):
+        if self._work is None:
+            work = self.tx_index.work(len(self.chain) - 1) if self.tx_index is not None else None
+            self._work = work if work is not None else sum(block_work(block.target) for block in self.chain)
+        return self._work
+    
+    def work_since(self, height):
+        with self.lock.read():
+            return sum(block_work(self.chain[i].target) for i in range(height, len(self.chain)))
         
     def create_genesis_block(self):
-        return Block(0, time.time(), [], "0")
+        return Block(0, GENESIS_TIMESTAMP, [], "0", target=difficulty_target(config.INITIAL_DIFFICULTY))
+    
+    @property
+    def pending_transactions(self):
+        return list(self.mempool)
     
+    def publish_tip(self):
+        self.tip = ChainTip(len(self.chain) - 1, self.chain[-1], self.total_work)
+        
     def get_latest_block(self):
-        return self.chain[-1]
+        return self.tip.block
     
     def add_transaction(self, transaction):
         if not isinstance(transaction, Transaction):
@@ -62,51 +430,217 @@ class Blockchain:
         if not transaction.is_valid():
             raise ValueError("Invalid signature of transaction format")
         
-        if transaction.sender != "SYSTEM":
-            sender_balance = self.get_balance(transaction.sender)
-            if transaction.amount > sender_balance:
-                raise ValueError("Insufficient funds")
-        
-        self.pending_transactions.append(transaction)
+        if not validation.is_amount(transaction.amount) or not validation.is_amount(transaction.fee):
+            raise ValueError("Invalid amount or fee")
         
-    def mine_pending_transactions(self, miner_address):
-        reward_tx = Transaction(
-            sender="SYSTEM",
-            recipient=miner_address,
-            amount=self.mining_reward,
-            signature=None
-        )
-        self.pending_transactions.append(reward_tx)
+        # The funds check and the insertion happen under both locks, so two
+        # spends of the same balance cannot both get in.
+        with self.lock.read(), self.mempool.lock:
+            self.mempool.expire()
+            if transaction.sender != "SYSTEM":
+                available = self.get_balance(transaction.sender) - self.mempool.spent_by(transaction.sender)
+                if transaction.amount + transaction.fee > available:
+                    raise ValueError("Insufficient funds")
+            
+            self.mempool.add(transaction)
         
-        new_block = Block(
-            index=len(self.chain),
-            timestamp=time.time(),
-            transaction=self.pending_transactions,
-            previous_hash=self.get_latest_block().hash
-        )
+    def append_block(self, block):
+        self.ledger.apply_block(block)
+        self.chain.append(block)
+        if self._work is not None:
+            self._work += block_work(block.target)
+        if self.tx_index is not None:
+            self.tx_index.add_block(block, len(self.chain) - 1, self.total_work)
+        if self.bootstrap is not None:
+            self.check_bootstrap(block)
+        elif config.SNAPSHOT_INTERVAL and block.index % config.SNAPSHOT_INTERVAL == 0 and not config.PRUNE_KEEP_BLOCKS:
+            self.take_snapshot()
         
-        self.proof_of_work(new_block)
-        self.chain.append(new_block)
-        self.save_chain_to_file()
-        self.pending_transactions = []
+    def truncate(self, length):
+        for i in range(len(self.chain) - 1, length - 1, -1):
+            block = self.chain[i]
+            if self._ledger is not None:
+                self._ledger.revert_block(block)
+            if self._work is not None:
+                self._work -= block_work(block.target)
+        self.chain.truncate(length)
+        if self.tx_index is not None:
+            self.tx_index.truncate(length)
+        if self.snapshot is not None and self.snapshot.height >= length:
+            self.snapshot = None
         
-    def proof_of_work(self, block):
-        while not block.hash.startswith('0' * self.difficulty):
-            block.nonce += 1
-            block.hash = block.calculate_hash()
+    # Replaces the blocks from height start onwards with blocks. Only the
+    # replaced blocks are undone, and each new block is checked against
+    # the balances left by the one before. If one fails, the old blocks
+    # are put back. Queued transactions the new blocks leave unfunded are
+    # dropped, and those only the old blocks contained go back to the
+    # mempool. Returns the replaced blocks.
+    # Callers pick blocks without holding the lock, so the link to the
+    # chain and the extra work are checked again under it.
+    def reorganize(self, start, blocks):
+        for block in blocks:
+            validation.check_structure(block, config.MAX_BLOCK_TXS, config.MAX_BLOCK_BYTES)
+        with self.lock:
+            if start < self.pruned_height:
+                raise ValueError(f"Cannot reorganize below the pruned height {self.pruned_height}")
+            if not blocks or not 0 < start <= len(self.chain) or blocks[0].previous_hash != self.chain[start - 1].hash:
+                raise ValueError("Blocks do not connect to the chain")
+            if sum(block_work(block.target) for block in blocks) <= self.work_since(start):
+                raise ValueError("Blocks do not add work to the chain")
+            old = self.chain[start:]
+            self.truncate(start)
+            try:
+                for block in blocks:
+                    validation.check_balances(block, self.ledger, self.mining_reward)
+                    self.append_block(block)
+            except Exception:
+                self.truncate(start)
+                for block in old:
+                    self.append_block(block)
+                raise
+            finally:
+                self.publish_tip()
+            
+            included = {tx.txid for block in blocks for tx in block.transaction}
+            self.mempool.remove(included)
+            senders = [sender for sender in list(self.mempool.by_sender) if sender != "SYSTEM"]
+            self.mempool.drop_unaffordable(senders, self.ledger.get_balance)
+            for block in old:
+                for tx in block.transaction:
+                    if tx.sender == "SYSTEM" or tx.txid in included:
+                        continue
+                    try:
+                        self.add_transaction(tx)
+                    except ValueError:
+                        pass
+            self.prune()
+        return old
+            
+    def find_fork_point(self, locator):
+        with self.lock.read():
+            for height, block_hash in locator:
+                if 0 <= height < len(self.chain) and self.chain[height].hash == block_hash:
+                    return height
+        return -1
+    
+    def find_block_height(self, block_hash, depth=None):
+        with self.lock.read():
+            stop = -1 if depth is None else max(len(self.chain) - 1 - depth, -1)
+            for i in range(len(self.chain) - 1, stop, -1):
+                if self.chain[i].hash == block_hash:
+                    return i
+            return None
+
+    def retarget_window(self, height):
+        with self.lock.read():
+            return [(block.timestamp, block.target) for block in self.chain[max(height - config.RETARGET_WINDOW - 1, 0):height]]
+    
+    def next_target(self):
+        with self.lock.read():
+            return retarget(self.retarget_window(len(self.chain)))
+    
+    def block_is_valid(self, block, window=None):
+        previous = self.chain[block.index - 1] if 0 < block.index <= len(self.chain) else None
+        if previous is None:
+            return False
+        if window is None:
+            window = self.retarget_window(block.index)
+        return block.hash == block.calculate_hash() and header_is_valid(block.header_dict(), previous.header_dict(), window)
+    
+    def build_locator(self):
+        with self.lock.read():
+            locator = []
+            height = len(self.chain) - 1
+            step = 1
+            while height > 0:
+                locator.append((height, self.chain[height].hash))
+                if len(locator) >= 10:
+                    step *= 2
+                height -= step
+            locator.append((0, self.chain[0].hash))
+            return locator
         
-    def is_chain_valid(self):
-        for i in range(1, len(self.chain)):
-            prev = self.chain[i-1]
-            curr = self.chain[i]
+    def create_block_template(self, miner_address):
+        with self.lock.read():
+            self.mempool.expire()
+            selected = self.mempool.select(config.MAX_BLOCK_TXS - 1, config.MAX_BLOCK_BYTES)
+            reward_tx = Transaction(
+                sender="SYSTEM",
+                recipient=miner_address,
+                amount=self.mining_reward + sum(tx.fee for tx in selected),
+                signature=None
+            )
             
-            if curr.hash != curr.calculate_hash():
+            return Block(
+                index=len(self.chain),
+                timestamp=time.time(),
+                transaction=selected + [reward_tx],
+                previous_hash=self.get_latest_block().hash,
+                target=self.next_target()
+            )
+    
+    # Runs the validation stages and appends the block if it still extends
+    # the tip. Returns False for a block that does not extend the tip and
+    # raises ValueError for an invalid one. Signatures are verified outside
+    # the lock, so the tip is checked again before the balances.
+    def add_block(self, block):
+        validation.check_structure(block, config.MAX_BLOCK_TXS, config.MAX_BLOCK_BYTES)
+        with self.lock.read():
+            if block.index != len(self.chain):
                 return False
+            validation.check_header(block, self.chain[block.index - 1], self.retarget_window(block.index))
             
-            if curr.previous_hash != prev.hash:
-                return False
+        validation.check_signatures(block)
         
+        with self.lock:
+            if block.index != len(self.chain) or block.previous_hash != self.get_latest_block().hash:
+                return False
+            validation.check_balances(block, self.ledger, self.mining_reward)
+            self.append_block(block)
+            self.prune()
+            self.publish_tip()
+            self.mempool.remove(tx.txid for tx in block.transaction)
+            senders = {tx.sender for tx in block.transaction if tx.sender != "SYSTEM"}
+            self.mempool.drop_unaffordable(senders, self.ledger.get_balance)
         return True
+        
+    def mine_pending_transactions(self, miner_address, workers=None):
+        new_block = self.create_block_template(miner_address)
+        self.proof_of_work(new_block, workers)
+        return self.add_block(new_block)
+        
+    # Returns False when stop_event was set before a nonce was found.
+    @metrics.timed(metrics.POW_SECONDS)
+    def proof_of_work(self, block, workers=None, stop_event=None):
+        workers = workers or self.mining_workers
+        if workers > 1:
+            self.hash_rate = parallel_proof_of_work(block, workers, stop_event)
+            return meets_target(block.hash, block.target)
+        
+        start_time = time.time()
+        hasher = block.nonce_hasher()
+        target = target_hex(block.target)
+        attempts = 1
+        while block.hash > target:
+            if stop_event is not None and attempts % CHECK_EVERY == 0 and stop_event.is_set():
+                break
+            block.nonce += 1
+            block.hash = hasher(block.nonce)
+            attempts += 1
+        elapsed = time.time() - start_time
+        self.hash_rate = attempts / elapsed if elapsed > 0 else 0.0
+        return block.hash <= target
+        
+    def is_chain_valid(self):
+        with self.lock.read():
+            window = deque([(self.chain[0].timestamp, self.chain[0].target)], maxlen=config.RETARGET_WINDOW + 1)
+            for i in range(1, len(self.chain)):
+                curr = self.chain[i]
+                if not self.block_is_valid(curr, list(window)):
+                    return False
+                window.append((curr.timestamp, curr.target))
+            
+            return True
     
     def print_chain(self):
         for block in self.chain:
@@ -122,56 +656,19 @@ class Blockchain:
             print()
 
     def get_balance(self, address):
-        balance = 0
-        for block in self.chain:
-            for tx in block.transaction:
-                if isinstance(tx, dict):
-                    sender = tx.get("sender")
-                    recipient = tx.get("recipient")
-                    amount = tx.get("amount")
-                else:
-                    sender = tx.sender
-                    recipient = tx.recipient
-                    amount = tx.amount
-                    
-                if sender == address:
-                    balance -= amount
-                if recipient == address:
-                    balance += amount
-        return balance
+        snapshot = self.bootstrap
+        if snapshot is not None:
+            return snapshot.balances.get(address, 0)
+        with self.lock.read():
+            return self.ledger.get_balance(address)
     
     def save_chain_to_file(self, filename="chain.json"):
-        chain_data = []
-        for block in self.chain:
-            transactions_data = [
-                tx.to_dict() if isinstance(tx, Transaction) else tx
-                for tx in block.transaction
-            ]
-            chain_data.append({
-                "index": block.index,
-                "timestamp": block.timestamp,
-                "transactions": transactions_data,
-                "previous_hash": block.previous_hash,
-                "nonce": block.nonce,
-                "hash": block.hash
-            })
+        with self.lock.read():
+            chain_data = [block.to_dict() for block in self.chain]
         with open(filename, "w") as f:
             json.dump(chain_data, f, indent=1)
             
     def load_chain_from_file(self, filename="chain.json"):
         with open(filename, "r") as f:
             data = json.load(f)
-            
-        chain = []
-        for block_data in data:
-            txs = [Transaction(**tx) for tx in block_data["transactions"]]
-            block = Block(
-                index=block_data["index"],
-                timestamp=block_data["timestamp"],
-                transaction=txs,
-                previous_hash=block_data["previous_hash"],
-                nonce=block_data["nonce"]
-            )
-            block.hash = block_data["hash"]
-            chain.append(block)
-        return chain
+        return [Block.from_dict(block_data, allow_pruned=True) for block_data in data]
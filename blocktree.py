@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+from blockchain import block_work
+import validation
+import config
+
+# Blocks that do not extend the tip. Side branches are kept by hash until
+# they fall more than max_depth blocks behind the tip; orphans, whose parent
+# is not known yet, wait in a bounded buffer until it arrives.
+# Only the part of each branch after the fork is stored, so comparing work
+# means summing the branch against the main chain since the fork.
+# side and orphans are guarded by the tree's own lock; where both are
+# needed, blockchain.lock is taken first.
+class BlockTree:
+    def __init__(self, blockchain, max_depth, max_orphans):
+        self.blockchain = blockchain
+        self.max_depth = max_depth
+        self.max_orphans = max_orphans
+        self.side = {}
+        self.orphans = OrderedDict()
+        self.lock = threading.RLock()
+
+    # Returns "extended", "reorg", "side", "orphan" or "known", and raises
+    # ValueError for an invalid block.
+    def receive(self, block):
+        with self.lock:
+            if block.hash in self.side or block.hash in self.orphans:
+                return "known"
+        if block.previous_hash == self.blockchain.get_latest_block().hash and self.blockchain.add_block(block):
+            status = "extended"
+        else:
+            status = self.add_side_block(block)
+        if status != "orphan":
+            self.connect_orphans(block.hash)
+        return status
+
+    def add_side_block(self, block):
+        validation.check_structure(block, config.MAX_BLOCK_TXS, config.MAX_BLOCK_BYTES)
+        with self.blockchain.lock, self.lock:
+            if self.blockchain.find_block_height(block.hash, self.max_depth) is not None:
+                return "known"
+            branch = self.branch(block.previous_hash)
+            if branch is not None:
+                fork_height, path = branch
+                parent = path[-1] if path else self.blockchain.chain[fork_height]
+                validation.check_header(block, parent, self.retarget_window(fork_height, path))
+        if branch is None:
+            self.add_orphan(block)
+            # The parent may have connected since it was looked up, after
+            # scanning the orphans for its children.
+            with self.blockchain.lock.read(), self.lock:
+                parent_known = self.branch(block.previous_hash) is not None
+            if parent_known:
+                self.connect_orphans(block.previous_hash)
+            return "orphan"
+
+        validation.check_signatures(block)
+
+        with self.blockchain.lock, self.lock:
+            branch = self.branch(block.previous_hash)
+            if branch is None:
+                return "known"
+            fork_height, path = branch
+            path.append(block)
+            self.side[block.hash] = block
+            if sum(block_work(b.target) for b in path) <= self.blockchain.work_since(fork_height + 1):
+                self.prune()
+                return "side"
+
+            try:
+                old = self.blockchain.reorganize(fork_height + 1, path)
+            except ValueError:
+                del self.side[block.hash]
+                raise
+            for b in path:
+                del self.side[b.hash]
+            for b in old:
+                self.side[b.hash] = b
+            self.prune()
+            print(f"[i] Reorganized to {block.hash} at height {block.index}, {len(old)} blocks replaced")
+            return "reorg"
+
+    # Walks side blocks back to the main chain. Returns the fork height and
+    # the side blocks after it, oldest first, or None if the ancestry is
+    # unknown or forks deeper than max_depth.
+    def branch(self, block_hash):
+        path = []
+        while block_hash in self.side:
+            block = self.side[block_hash]
+            path.append(block)
+            block_hash = block.previous_hash
+        fork_height = self.blockchain.find_block_height(block_hash, self.max_depth)
+        if fork_height is None:
+            return None
+        path.reverse()
+        return fork_height, path
+
+    def retarget_window(self, fork_height, path):
+        size = config.RETARGET_WINDOW + 1
+        window = [(b.timestamp, b.target) for b in path[-size:]]
+        if len(window) < size:
+            window = self.blockchain.retarget_window(fork_height + 1)[-(size - len(window)):] + window
+        return window
+
+    # Anyone can send a block with an unknown parent, so it must carry real
+    # work before it may push a buffered one out. A retarget moves at most
+    # 4x, so anything easier than that past the tip is not buffered.
+    def add_orphan(self, block):
+        validation.check_proof(block, self.blockchain.get_latest_block().target * 4)
+        with self.lock:
+            self.orphans[block.hash] = block
+            if len(self.orphans) > self.max_orphans:
+                self.orphans.popitem(last=False)
+
+    def connect_orphans(self, parent_hash):
+        with self.lock:
+            children = [b for b in self.orphans.values() if b.previous_hash == parent_hash]
+            for child in children:
+                del self.orphans[child.hash]
+        for child in children:
+            try:
+                self.receive(child)
+            except ValueError as e:
+                print(f"[!] Buffered block {child.hash} was rejected: {e}")
+
+    def prune(self):
+        min_height = len(self.blockchain.chain) - 1 - self.max_depth
+        for block_hash in [h for h, b in self.side.items() if b.index <= min_height]:
+            del self.side[block_hash]
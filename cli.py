@@ -1,7 +1,7 @@
 import argparse
 from wallet import generate_keypair, save_keys_to_files, load_private_key, load_public_key, get_address_from_public_key
-from transaction import Transaction
-from blockchain import Blockchain
+from transaction import Transaction, verify_merkle_proof
+from blockchain import Blockchain, calculate_header_hash
 import os
 import base64
 import requests
@@ -21,7 +21,7 @@ def show_address():
     pub = load_public_key(f"{WALLET_PREFIX}_public.pem")
     print(f"🔑 Your address: {get_address_from_public_key(pub)}")
     
-def send_transaction(to, amount):
+def send_transaction(to, amount, fee=0):
     priv = load_private_key(f"{WALLET_PREFIX}_private.pem")
     pub = load_public_key(f"{WALLET_PREFIX}_public.pem")
     addr = get_address_from_public_key(pub)
@@ -29,17 +29,13 @@ def send_transaction(to, amount):
     tx = Transaction(
         sender=addr,
         recipient=to,
-        amount=float(amount)
+        amount=float(amount),
+        fee=float(fee)
     )
     tx.sign(priv)
     
     import requests
-    response = requests.post("http://localhost:5000/transaction/new", json={
-        "sender": tx.sender,
-        "recipient": tx.recipient,
-        "amount": tx.amount,
-        "signature": tx.signature
-    })
+    response = requests.post("http://localhost:5000/transaction/new", json=tx.to_signed_dict())
     
     if response.status_code == 201:
         print("✅ Transaction sent")
@@ -54,15 +50,27 @@ def mine_block():
     
     if response.status_code == 200:
         data = response.json()
-        print(f"✅ Mined block #{data['index']} with {data['transactions']} transactions")
+        print(f"✅ Mined block #{data['index']} with {data['transaction']} transactions")
         print(f"🔗 Hash: {data['hash']}")
     else:
         print(f"❌ Mining error: {response.text}")
-    
-    from blockchain import Blockchain
-    bc = Blockchain()
-    bc.mine_pending_transactions(addr)
-    bc.print_chain()
+        
+def control_miner(action):
+    if action == "start":
+        pub = load_public_key(f"{WALLET_PREFIX}_public.pem")
+        response = requests.post(f"{NODE_URL}/miner/start", json={"miner_address": get_address_from_public_key(pub)})
+    elif action == "stop":
+        response = requests.post(f"{NODE_URL}/miner/stop")
+    else:
+        response = requests.get(f"{NODE_URL}/miner/status")
+        
+    if response.status_code == 200:
+        data = response.json()
+        state = "running" if data["running"] else "stopped"
+        print(f"⛏️ Miner {state}, {data['blocks_mined']} blocks mined at {data['hash_rate']} H/s")
+        print(f"🧱 Height: {data['height']}")
+    else:
+        print(f"❌ Error: {response.text}")
 
 def check_balance():
     from blockchain import Blockchain
@@ -87,6 +95,22 @@ def show_latest_block():
     else:
         print(f"❌ Error: {response.text}")
 
+def verify_transaction(txid):
+    response = requests.get(f"{NODE_URL}/tx/proof", params={"txid": txid})
+    if response.status_code != 200:
+        print(f"❌ Error: {response.text}")
+        return
+    
+    data = response.json()
+    header = data["header"]
+    if calculate_header_hash(header) != header["hash"]:
+        print("❌ Block header does not match its hash")
+    elif not verify_merkle_proof(txid, data["proof"], header["merkle_root"]):
+        print("❌ Merkle proof is invalid")
+    else:
+        print(f"✅ Transaction included in block #{header['index']}")
+        print(f"🔗 Hash: {header['hash']}")
+
 def sign_transaction_only(to, amount):
     private_key = load_private_key(f"{WALLET_PREFIX}_private.pem")
     public_key = load_public_key(f"{WALLET_PREFIX}_public.pem")
@@ -120,9 +144,13 @@ if __name__ == "__main__":
     send_parser = subparsers.add_parser("send", help="Send transaction")
     send_parser.add_argument("--to", required=True, help="Recipient address")
     send_parser.add_argument("--amount", required=True, help="Amount")
+    send_parser.add_argument("--fee", default=0, help="Fee paid to the miner")
     
     subparsers.add_parser("mine", help="Mine a new block")
     
+    miner_parser = subparsers.add_parser("miner", help="Control the node's background miner")
+    miner_parser.add_argument("action", choices=["start", "stop", "status"], help="What to do")
+    
     subparsers.add_parser("balance", help="Check balance")
     
     subparsers.add_parser("chain", help="Show latest block")
@@ -131,6 +159,9 @@ if __name__ == "__main__":
     sign_parser.add_argument("--to", required=True, help="Recipient address")
     sign_parser.add_argument("--amount", required=True, help="Amount")
     
+    verify_parser = subparsers.add_parser("verify-tx", help="Verify a transaction is included in a block")
+    verify_parser.add_argument("--txid", required=True, help="Transaction id")
+    
     args = parser.parse_args()
     
     if args.command == "create-wallet":
@@ -138,14 +169,18 @@ if __name__ == "__main__":
     elif args.command == "show-address":
         show_address()
     elif args.command == "send":
-        send_transaction(args.to, args.amount)
+        send_transaction(args.to, args.amount, args.fee)
     elif args.command == "mine":
         mine_block()
+    elif args.command == "miner":
+        control_miner(args.action)
     elif args.command == "balance":
         check_balance()
     elif args.command == "chain":
         show_latest_block()
     elif args.command == "sign-tx":
         sign_transaction_only(args.to, args.amount)
+    elif args.command == "verify-tx":
+        verify_transaction(args.txid)
     else:
         parser.print_help()
\ No newline at end of file
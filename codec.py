@@ -0,0 +1,243 @@
+import base64
+import binascii
+import struct
+from transaction import Transaction
+
+MIME_TYPE = "application/x-hanicoin"
+
+# Every binary block starts with this byte; JSON records start with "{",
+# so records written before the binary format can still be told apart.
+# Pruned blocks carry their Merkle root in place of the transactions.
+BLOCK_FORMAT = 1
+PRUNED_FORMAT = 2
+
+DOUBLE = struct.Struct(">d")
+
+NONE, RAW, TEXT = 0, 1, 2
+INT, FLOAT = 0, 1
+
+def put_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def put_number(out, value):
+    if isinstance(value, int):
+        out.append(INT)
+        put_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    else:
+        out.append(FLOAT)
+        out += DOUBLE.pack(value)
+
+def put_text(out, value):
+    data = value.encode()
+    put_varint(out, len(data))
+    out += data
+
+# Keys, signatures and hashes are stored raw when they decode to the expected
+# size and re-encode to the exact same string; anything else (the "SYSTEM"
+# sender, the genesis previous hash) is kept as text so hashes never change.
+def put_encoded(out, value, size, decode, encode):
+    if value is None:
+        out.append(NONE)
+        return
+    try:
+        raw = decode(value)
+    except (binascii.Error, ValueError):
+        raw = None
+    if raw is not None and len(raw) == size and encode(raw) == value:
+        out.append(RAW)
+        out += raw
+    else:
+        out.append(TEXT)
+        put_text(out, value)
+
+def b64_decode(value):
+    return base64.b64decode(value, validate=True)
+
+def b64_encode(raw):
+    return base64.b64encode(raw).decode()
+
+def hex_decode(value):
+    return bytes.fromhex(value)
+
+def hex_encode(raw):
+    return raw.hex()
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise ValueError("truncated record")
+        chunk = bytes(self.data[self.pos:self.pos + size])
+        self.pos += size
+        return chunk
+
+    def varint(self):
+        value = 0
+        shift = 0
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def number(self):
+        tag = self.byte()
+        if tag == INT:
+            value = self.varint()
+            return value // 2 if value % 2 == 0 else -(value + 1) // 2
+        if tag == FLOAT:
+            return DOUBLE.unpack(self.take(DOUBLE.size))[0]
+        raise ValueError(f"unknown number tag {tag}")
+
+    def text(self):
+        return self.take(self.varint()).decode()
+
+    def encoded(self, size, encode):
+        tag = self.byte()
+        if tag == NONE:
+            return None
+        if tag == RAW:
+            return encode(self.take(size))
+        if tag == TEXT:
+            return self.text()
+        raise ValueError(f"unknown field tag {tag}")
+
+def put_transaction(out, tx):
+    put_encoded(out, tx.sender, 32, b64_decode, b64_encode)
+    put_encoded(out, tx.recipient, 32, b64_decode, b64_encode)
+    put_number(out, tx.amount)
+    put_number(out, tx.fee)
+    put_encoded(out, tx.signature, 64, b64_decode, b64_encode)
+
+def read_transaction(reader):
+    return Transaction(
+        sender=reader.encoded(32, b64_encode),
+        recipient=reader.encoded(32, b64_encode),
+        amount=reader.number(),
+        fee=reader.number(),
+        signature=reader.encoded(64, b64_encode)
+    )
+
+def encode_transactions(transactions):
+    out = bytearray()
+    put_varint(out, len(transactions))
+    for tx in transactions:
+        put_transaction(out, tx)
+    return bytes(out)
+
+def decode_transactions(data):
+    reader = Reader(data)
+    return [read_transaction(reader) for _ in range(reader.varint())]
+
+def encode_block(block):
+    out = bytearray([PRUNED_FORMAT if block.pruned else BLOCK_FORMAT])
+    put_varint(out, block.version)
+    put_varint(out, block.index)
+    put_number(out, block.timestamp)
+    put_encoded(out, block.previous_hash, 32, hex_decode, hex_encode)
+    put_varint(out, block.nonce)
+    put_encoded(out, block.hash, 32, hex_decode, hex_encode)
+    if block.version >= 4:
+        out += block.target.to_bytes(32, "big")
+    if block.pruned:
+        put_encoded(out, block.merkle_root, 32, hex_decode, hex_encode)
+        return bytes(out)
+    put_varint(out, len(block.transaction))
+    for tx in block.transaction:
+        put_transaction(out, tx)
+    return bytes(out)
+
+# Returns the keyword arguments of Block, so this module does not have to
+# import blockchain. A pruned block's hash no longer commits to anything we
+# hold, so pruned records are only read from our own block file.
+def decode_block(data, allow_pruned=False):
+    reader = Reader(data)
+    block_format = reader.byte()
+    if block_format not in (BLOCK_FORMAT, PRUNED_FORMAT):
+        raise ValueError("not a binary block")
+    if block_format == PRUNED_FORMAT and not allow_pruned:
+        raise ValueError("pruned blocks are only read from the local store")
+    version = reader.varint()
+    index = reader.varint()
+    timestamp = reader.number()
+    previous_hash = reader.encoded(32, hex_encode)
+    nonce = reader.varint()
+    block_hash = reader.encoded(32, hex_encode)
+    target = int.from_bytes(reader.take(32), "big") if version >= 4 else None
+    if block_format == PRUNED_FORMAT:
+        pruned_root = reader.encoded(32, hex_encode)
+        transactions = []
+    else:
+        pruned_root = None
+        transactions = [read_transaction(reader) for _ in range(reader.varint())]
+    return {
+        "index": index,
+        "timestamp": timestamp,
+        "transaction": transactions,
+        "previous_hash": previous_hash,
+        "nonce": nonce,
+        "version": version,
+        "block_hash": block_hash,
+        "target": target,
+        "pruned_root": pruned_root
+    }
+
+def frame(payload):
+    out = bytearray()
+    put_varint(out, len(payload))
+    return bytes(out) + payload
+
+# Takes the first complete frame off the front of buffer, or returns None
+# while it is still incomplete. For readers that receive data in chunks.
+def split_frame(buffer):
+    length = 0
+    shift = 0
+    for i, byte in enumerate(buffer):
+        length |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            end = i + 1 + length
+            if len(buffer) < end:
+                return None
+            payload = bytes(buffer[i + 1:end])
+            del buffer[:end]
+            return payload
+        shift += 7
+    return None
+
+def read_exact(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise ValueError("stream ended inside a frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def iter_frames(stream):
+    while True:
+        first = stream.read(1)
+        if not first:
+            return
+        length = 0
+        shift = 0
+        byte = first[0]
+        while True:
+            length |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+            byte = read_exact(stream, 1)[0]
+        yield read_exact(stream, length)
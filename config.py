@@ -0,0 +1,56 @@
+import os
+
+MINING_WORKERS = int(os.environ.get("HANICOIN_MINING_WORKERS", os.cpu_count() or 1))
+
+CHAIN_FILE = os.environ.get("HANICOIN_CHAIN_FILE", "chain.json")
+BLOCKS_FILE = os.environ.get("HANICOIN_BLOCKS_FILE", "chain.dat")
+FSYNC_EVERY = int(os.environ.get("HANICOIN_FSYNC_EVERY", 1))
+LAZY_CHAIN = os.environ.get("HANICOIN_LAZY_CHAIN", "1") == "1"
+CHAIN_CACHE_SIZE = int(os.environ.get("HANICOIN_CHAIN_CACHE_SIZE", 256))
+COLUMNAR_ARCHIVE = os.environ.get("HANICOIN_COLUMNAR_ARCHIVE", "1") == "1"
+SIGNATURE_WORKERS = int(os.environ.get("HANICOIN_SIGNATURE_WORKERS", os.cpu_count() or 1))
+SIGNATURE_CACHE_SIZE = int(os.environ.get("HANICOIN_SIGNATURE_CACHE_SIZE", 100000))
+MEMPOOL_MAX_BYTES = int(os.environ.get("HANICOIN_MEMPOOL_MAX_BYTES", 5_000_000))
+MEMPOOL_MAX_AGE = int(os.environ.get("HANICOIN_MEMPOOL_MAX_AGE", 3 * 60 * 60))
+MAX_BLOCK_TXS = int(os.environ.get("HANICOIN_MAX_BLOCK_TXS", 1000))
+MAX_BLOCK_BYTES = int(os.environ.get("HANICOIN_MAX_BLOCK_BYTES", 500_000))
+SYNC_HEADERS_LIMIT = int(os.environ.get("HANICOIN_SYNC_HEADERS_LIMIT", 2000))
+SYNC_RANGE_SIZE = int(os.environ.get("HANICOIN_SYNC_RANGE_SIZE", 100))
+SYNC_WORKERS = int(os.environ.get("HANICOIN_SYNC_WORKERS", 4))
+PEER_TIMEOUT = float(os.environ.get("HANICOIN_PEER_TIMEOUT", 5))
+GOSSIP_WORKERS = int(os.environ.get("HANICOIN_GOSSIP_WORKERS", 8))
+GOSSIP_SEEN_SIZE = int(os.environ.get("HANICOIN_GOSSIP_SEEN_SIZE", 100000))
+GOSSIP_MAX_BACKOFF = float(os.environ.get("HANICOIN_GOSSIP_MAX_BACKOFF", 60))
+INITIAL_DIFFICULTY = int(os.environ.get("HANICOIN_INITIAL_DIFFICULTY", 4))
+TARGET_BLOCK_TIME = float(os.environ.get("HANICOIN_TARGET_BLOCK_TIME", 60))
+RETARGET_WINDOW = int(os.environ.get("HANICOIN_RETARGET_WINDOW", 20))
+MAX_FUTURE_DRIFT = float(os.environ.get("HANICOIN_MAX_FUTURE_DRIFT", 10 * 60))
+MAX_REORG_DEPTH = int(os.environ.get("HANICOIN_MAX_REORG_DEPTH", 100))
+MAX_ORPHANS = int(os.environ.get("HANICOIN_MAX_ORPHANS", 100))
+SNAPSHOT_FILE = os.environ.get("HANICOIN_SNAPSHOT_FILE", "snapshot.json")
+SNAPSHOT_INTERVAL = int(os.environ.get("HANICOIN_SNAPSHOT_INTERVAL", 100))
+SNAPSHOT_BOOTSTRAP = os.environ.get("HANICOIN_SNAPSHOT_BOOTSTRAP", "1") == "1"
+PRUNE_KEEP_BLOCKS = int(os.environ.get("HANICOIN_PRUNE_KEEP_BLOCKS", 0))
+TX_INDEX_FILE = os.environ.get("HANICOIN_TX_INDEX_FILE", "index.db")
+HISTORY_PAGE_SIZE = int(os.environ.get("HANICOIN_HISTORY_PAGE_SIZE", 100))
+METRICS = os.environ.get("HANICOIN_METRICS", "1") == "1"
+SERVER_THREADS = int(os.environ.get("HANICOIN_SERVER_THREADS", 32))
+SERVER_BACKLOG = int(os.environ.get("HANICOIN_SERVER_BACKLOG", 2048))
+PEER_MAX_CONNECTIONS = int(os.environ.get("HANICOIN_PEER_MAX_CONNECTIONS", 100))
+PEERS_FILE = os.environ.get("HANICOIN_PEERS_FILE", "peers.json")
+BOOTSTRAP_PEERS = os.environ.get("HANICOIN_BOOTSTRAP_PEERS", "http://localhost:5000,http://localhost:5001").split(",")
+MAX_OUTBOUND_PEERS = int(os.environ.get("HANICOIN_MAX_OUTBOUND_PEERS", 8))
+PEER_MAX_FAILURES = int(os.environ.get("HANICOIN_PEER_MAX_FAILURES", 5))
+PEER_PROBE_INTERVAL = float(os.environ.get("HANICOIN_PEER_PROBE_INTERVAL", 30))
+PEER_PROBE_WORKERS = int(os.environ.get("HANICOIN_PEER_PROBE_WORKERS", 16))
+
+# A node's own data files carry its port by default, so local nodes on
+# different ports started from one directory never share them. node.py
+# calls this before opening any of them; CHAIN_FILE is only read, for the
+# migration, and stays shared.
+def use_port(port):
+    global BLOCKS_FILE, SNAPSHOT_FILE, TX_INDEX_FILE, PEERS_FILE
+    BLOCKS_FILE = os.environ.get("HANICOIN_BLOCKS_FILE", f"chain-{port}.dat")
+    SNAPSHOT_FILE = os.environ.get("HANICOIN_SNAPSHOT_FILE", f"snapshot-{port}.json")
+    TX_INDEX_FILE = os.environ.get("HANICOIN_TX_INDEX_FILE", f"index-{port}.db")
+    PEERS_FILE = os.environ.get("HANICOIN_PEERS_FILE", f"peers-{port}.json")
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import codec
+import metrics
+
+# Broadcasts run on a shared thread pool, so a request handler only queues
+# them. Each peer keeps its own keep-alive session, and a peer that keeps
+# failing is skipped for an exponentially growing backoff period. Results
+# are also reported to health, the peer manager, when one is given.
+class Gossip:
+    def __init__(self, workers, timeout, seen_size, max_backoff, health=None):
+        self.executor = ThreadPoolExecutor(workers)
+        self.workers = workers
+        self.timeout = timeout
+        self.seen_size = seen_size
+        self.max_backoff = max_backoff
+        self.health = health
+        self.sessions = {}
+        self.failures = {}
+        self.retry_at = {}
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+        
+    def has_seen(self, item_id):
+        with self.lock:
+            return item_id in self.seen
+        
+    def mark_seen(self, item_id):
+        with self.lock:
+            if item_id in self.seen:
+                self.seen.move_to_end(item_id)
+                return False
+            self.seen[item_id] = True
+            if len(self.seen) > self.seen_size:
+                self.seen.popitem(last=False)
+            return True
+        
+    def session(self, peer):
+        with self.lock:
+            session = self.sessions.get(peer)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[peer] = session
+            return session
+        
+    def available(self, peer):
+        with self.lock:
+            return self.retry_at.get(peer, 0) <= time.time()
+        
+    def broadcast(self, peers, path, data):
+        futures = []
+        for peer in list(peers):
+            if self.available(peer):
+                futures.append(self.executor.submit(self.send, peer, path, data))
+        return futures
+    
+    def send(self, peer, path, data):
+        start = time.perf_counter()
+        try:
+            if isinstance(data, bytes):
+                response = self.session(peer).post(f"{peer}{path}", data=data, timeout=self.timeout,
+                                                   headers={"Content-Type": codec.MIME_TYPE})
+            else:
+                response = self.session(peer).post(f"{peer}{path}", json=data, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.record_failure(peer, e)
+            return None
+        self.record_success(peer, time.perf_counter() - start)
+        return response.status_code
+    
+    def record_success(self, peer, elapsed):
+        metrics.GOSSIP_SECONDS.labels(peer).observe(elapsed)
+        if self.health is not None:
+            self.health.record_success(peer, elapsed)
+        with self.lock:
+            self.failures.pop(peer, None)
+            self.retry_at.pop(peer, None)
+            
+    def record_failure(self, peer, error):
+        metrics.GOSSIP_FAILURES.labels(peer).inc()
+        print(f"[!] Gossip to {peer} failed: {error}")
+        if self.health is not None:
+            self.health.record_failure(peer)
+        with self.lock:
+            failures = self.failures.get(peer, 0) + 1
+            self.failures[peer] = failures
+            self.retry_at[peer] = time.time() + min(2 ** failures, self.max_backoff)
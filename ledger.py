@@ -0,0 +1,40 @@
+def transaction_fields(tx):
+    if isinstance(tx, dict):
+        return tx.get("sender"), tx.get("recipient"), tx.get("amount"), tx.get("fee", 0)
+    return tx.sender, tx.recipient, tx.amount, tx.fee
+
+class BalanceLedger:
+    def __init__(self):
+        self.balances = {}
+        
+    def rebuild(self, chain):
+        self.balances = {}
+        for block in chain:
+            self.apply_block(block)
+            
+    def restore(self, balances, blocks):
+        self.balances = dict(balances)
+        for block in blocks:
+            self.apply_block(block)
+            
+    def apply_block(self, block):
+        for tx in block.transaction:
+            sender, recipient, amount, fee = transaction_fields(tx)
+            self._adjust(sender, -(amount + fee))
+            self._adjust(recipient, amount)
+            
+    def revert_block(self, block):
+        for tx in reversed(block.transaction):
+            sender, recipient, amount, fee = transaction_fields(tx)
+            self._adjust(recipient, -amount)
+            self._adjust(sender, amount + fee)
+            
+    def get_balance(self, address):
+        return self.balances.get(address, 0)
+    
+    def _adjust(self, address, amount):
+        balance = self.balances.get(address, 0) + amount
+        if balance:
+            self.balances[address] = balance
+        else:
+            self.balances.pop(address, None)
@@ -0,0 +1,75 @@
+import threading
+from contextlib import contextmanager
+
+# Many readers or one writer. Used as a context manager it takes the write
+# side, so "with lock:" keeps its exclusive meaning; readers use read().
+# Both sides are reentrant, and a writer may also read. Waiting writers
+# hold back new readers so a stream of reads cannot starve them.
+# A reader may not upgrade to a writer, as two upgrading readers would
+# wait on each other forever.
+class ReadWriteLock:
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.depth = 0
+        self.waiting_writers = 0
+        self.local = threading.local()
+
+    def acquire_read(self):
+        held = getattr(self.local, "held", None)
+        if held is None:
+            held = self.local.held = []
+        if held or self.writer == threading.get_ident():
+            held.append(False)
+            return
+        with self.condition:
+            while self.writer is not None or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        held.append(True)
+
+    def release_read(self):
+        if not self.local.held.pop():
+            return
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer == me:
+                self.depth += 1
+                return
+            if getattr(self.local, "held", None):
+                raise RuntimeError("cannot take the write lock while holding the read lock")
+            self.waiting_writers += 1
+            while self.writer is not None or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = me
+            self.depth = 1
+
+    def release_write(self):
+        with self.condition:
+            self.depth -= 1
+            if not self.depth:
+                self.writer = None
+                self.condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    def __enter__(self):
+        self.acquire_write()
+        return self
+
+    def __exit__(self, *exc):
+        self.release_write()
@@ -0,0 +1,127 @@
+import heapq
+import json
+import threading
+import time
+
+def transaction_size(tx):
+    return len(json.dumps(tx.to_signed_dict(), separators=(",", ":")))
+
+class MempoolEntry:
+    def __init__(self, tx):
+        self.tx = tx
+        self.txid = tx.txid
+        self.size = transaction_size(tx)
+        self.fee_rate = tx.fee / self.size
+        self.added = time.time()
+
+# Request threads, the miner and block connection share one mempool, so
+# every change to it happens under its own lock.
+class Mempool:
+    def __init__(self, max_bytes, max_age):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.clear()
+        
+    def clear(self):
+        with self.lock:
+            self.by_txid = {}
+            self.by_sender = {}
+            self.pending_out = {}
+            self.total_bytes = 0
+            self.heap = []
+        
+    def __len__(self):
+        return len(self.by_txid)
+    
+    def __iter__(self):
+        with self.lock:
+            return iter([entry.tx for entry in self.by_txid.values()])
+    
+    def __contains__(self, txid):
+        return txid in self.by_txid
+    
+    def spent_by(self, sender):
+        return self.pending_out.get(sender, 0)
+    
+    def add(self, tx):
+        with self.lock:
+            entry = MempoolEntry(tx)
+            if entry.txid in self.by_txid:
+                raise ValueError("Duplicate transaction")
+        
+            self.by_txid[entry.txid] = entry
+            self.by_sender.setdefault(tx.sender, set()).add(entry.txid)
+            self.pending_out[tx.sender] = self.spent_by(tx.sender) + tx.amount + tx.fee
+            self.total_bytes += entry.size
+            heapq.heappush(self.heap, (entry.fee_rate, -entry.added, entry.txid))
+        
+            evicted = self.evict()
+            if entry.txid not in self.by_txid:
+                raise ValueError("Mempool is full and the fee is too low")
+            return evicted
+    
+    def remove(self, txids):
+        with self.lock:
+            removed = []
+            for txid in txids:
+                entry = self.by_txid.pop(txid, None)
+                if entry is None:
+                    continue
+                sender = entry.tx.sender
+                self.by_sender[sender].discard(txid)
+                if not self.by_sender[sender]:
+                    del self.by_sender[sender]
+                    self.pending_out.pop(sender, None)
+                else:
+                    self.pending_out[sender] -= entry.tx.amount + entry.tx.fee
+                self.total_bytes -= entry.size
+                removed.append(entry.tx)
+            if len(self.heap) > 2 * len(self.by_txid) + 64:
+                self.heap = [item for item in self.heap if item[2] in self.by_txid]
+                heapq.heapify(self.heap)
+            return removed
+    
+    # When a block spends funds the queue was counting on, a sender's newest
+    # transactions are dropped until the rest fit in balance(sender).
+    def drop_unaffordable(self, senders, balance):
+        with self.lock:
+            dropped = []
+            for sender in senders:
+                txids = sorted(self.by_sender.get(sender, ()), key=lambda txid: self.by_txid[txid].added)
+                while txids and self.spent_by(sender) > balance(sender):
+                    dropped.extend(self.remove([txids.pop()]))
+            return dropped
+    
+    # Lowest fee-per-byte goes first; on equal fee rate the newest entry
+    # is dropped so older transactions keep their place.
+    def evict(self):
+        evicted = []
+        while self.total_bytes > self.max_bytes and self.heap:
+            _, _, txid = heapq.heappop(self.heap)
+            evicted.extend(self.remove([txid]))
+        return evicted
+    
+    def expire(self, now=None):
+        with self.lock:
+            cutoff = (now or time.time()) - self.max_age
+            expired = []
+            for txid, entry in self.by_txid.items():
+                if entry.added > cutoff:
+                    break
+                expired.append(txid)
+            return self.remove(expired)
+    
+    def select(self, max_txs, max_bytes):
+        with self.lock:
+            entries = sorted(self.by_txid.values(), key=lambda e: (-e.fee_rate, e.added))
+            selected = []
+            used = 0
+            for entry in entries:
+                if len(selected) >= max_txs:
+                    break
+                if used + entry.size > max_bytes:
+                    continue
+                selected.append(entry.tx)
+                used += entry.size
+            return selected
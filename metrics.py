@@ -0,0 +1,188 @@
+import bisect
+import functools
+import threading
+import time
+import config
+
+ENABLED = config.METRICS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+REGISTRY = []
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class GaugeValue(CounterValue):
+    def set(self, value):
+        self.value = value
+
+class HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+# A metric family in the Prometheus text format. Labelled families hold
+# one child per label combination; unlabelled ones forward to their only
+# child, so counter.inc() and counter.labels("a").inc() both work.
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self.render_child(format_labels(self.labelnames, values), values, child))
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render_child(self, labels, values, child):
+        return [f"{self.name}{labels} {format_value(child.value)}"]
+
+# A gauge is either set directly or reads its value from a function when
+# scraped, which costs nothing on the hot path.
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = None
+
+    def new_child(self):
+        return GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.function = function
+
+    def render(self):
+        if self.function is not None:
+            try:
+                self.labels().set(self.function())
+            except Exception as e:
+                print(f"[!] Could not read metric {self.name}: {e}")
+        return super().render()
+
+    def render_child(self, labels, values, child):
+        return [f"{self.name}{labels} {format_value(child.value)}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render_child(self, labels, values, child):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else format_value(bound)
+            bucket_labels = format_labels(self.labelnames + ("le",), values + (le,))
+            lines.append(f"{self.name}_bucket{bucket_labels} {total}")
+        lines.append(f"{self.name}_sum{labels} {format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Wraps a function to record its duration in histogram. With metrics off
+# the function is returned untouched, so hot paths pay nothing.
+def timed(histogram):
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+HASH_RATE = Gauge("hanicoin_hash_rate", "Hashes per second of the last proof-of-work run")
+POW_SECONDS = Histogram("hanicoin_pow_seconds", "Duration of proof-of-work runs",
+                        buckets=(0.1, 1, 5, 15, 30, 60, 120, 300, 600))
+BLOCK_HASH_SECONDS = Histogram("hanicoin_block_hash_seconds", "Duration of Block.calculate_hash calls")
+TX_VERIFY_SECONDS = Histogram("hanicoin_tx_verify_seconds", "Duration of Transaction.is_valid calls")
+MEMPOOL_TRANSACTIONS = Gauge("hanicoin_mempool_transactions", "Transactions in the mempool")
+MEMPOOL_BYTES = Gauge("hanicoin_mempool_bytes", "Serialized size of the mempool")
+CHAIN_LENGTH = Gauge("hanicoin_chain_length", "Blocks in the main chain")
+CHAIN_FILE_BYTES = Gauge("hanicoin_chain_file_bytes", "Size of the block file")
+CHAIN_LOAD_SECONDS = Gauge("hanicoin_chain_load_seconds", "Time taken to open the chain at startup")
+BLOCK_SAVE_SECONDS = Histogram("hanicoin_block_save_seconds", "Duration of block appends to the block file")
+GOSSIP_SECONDS = Histogram("hanicoin_gossip_seconds", "Latency of gossip sends per peer", ("peer",))
+GOSSIP_FAILURES = Counter("hanicoin_gossip_failures_total", "Failed gossip sends per peer", ("peer",))
+KNOWN_PEERS = Gauge("hanicoin_known_peers", "Peers held by the peer manager")
+SYNC_SECONDS = Histogram("hanicoin_sync_seconds", "Duration of sync rounds",
+                         buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300))
+SYNC_BYTES = Counter("hanicoin_sync_bytes_total", "Bytes of headers and blocks received while syncing")
+HTTP_SECONDS = Histogram("hanicoin_http_request_seconds", "Latency of HTTP requests per route",
+                         ("method", "route", "status"))
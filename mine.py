@@ -1,6 +1,7 @@
 from blockchain import Blockchain
 from wallet import load_private_key, load_public_key, get_address_from_public_key
 from transaction import Transaction
+import config
 import time
 
 miner_private = load_private_key("mywallet_private.pem")
@@ -20,10 +21,11 @@ bc.add_transaction(tx)
 print(">>> Start mining...")
 
 start_time = time.time()
-bc.mine_pending_transactions(miner_address)
+bc.mine_pending_transactions(miner_address, config.MINING_WORKERS)
 end_time = time.time()
 
 print(f"Mining comppleted in {round(end_time - start_time, 2)} seconds")
+print(f"Hash rate: {round(bc.hash_rate, 2)} H/s on {config.MINING_WORKERS} workers")
 print(f"Miner's balance: {bc.mining_reward}")
 print("Result:")
 bc.print_chain()
\ No newline at end of file
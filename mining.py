@@ -0,0 +1,156 @@
+import multiprocessing
+import threading
+import time
+
+CHECK_EVERY = 2000
+POLL_INTERVAL = 0.05
+
+_stop_event = None
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+def _search(block, start, step):
+    target = f"{block.target:064x}"
+    hasher = block.nonce_hasher()
+    nonce = start
+    attempts = 0
+    while not _stop_event.is_set():
+        for _ in range(CHECK_EVERY):
+            block_hash = hasher(nonce)
+            attempts += 1
+            if block_hash <= target:
+                _stop_event.set()
+                return nonce, block_hash, attempts
+            nonce += step
+    return None, None, attempts
+
+# Workers live in one pool for the life of the process instead of being
+# forked for every search. The node starts it before any of its threads,
+# so the fork cannot copy a lock some thread holds; other callers get it on
+# first use. Children of spawn would re-run the node's main module, so fork
+# is used where there is one. The pool grows when more workers are asked
+# for, and runs one search at a time.
+_pool = None
+_pool_size = 0
+_pool_stop = None
+_pool_lock = threading.Lock()
+
+def _get_pool(workers):
+    global _pool, _pool_size, _pool_stop
+    if _pool is None or workers > _pool_size:
+        if _pool is not None:
+            _pool.terminate()
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        _pool_stop = ctx.Event()
+        _pool = ctx.Pool(workers, initializer=_init_worker, initargs=(_pool_stop,))
+        _pool_size = workers
+    return _pool, _pool_stop
+
+def start_pool(workers):
+    with _pool_lock:
+        _get_pool(workers)
+
+# stop_event may be any event; it is passed on to the workers while they
+# are polled for a result.
+def parallel_proof_of_work(block, workers, stop_event=None):
+    with _pool_lock:
+        pool, pool_stop = _get_pool(workers)
+        pool_stop.clear()
+        start_time = time.time()
+        jobs = [
+            pool.apply_async(_search, (block, block.nonce + i, workers))
+            for i in range(workers)
+        ]
+        for job in jobs:
+            while not job.ready():
+                if stop_event is not None and stop_event.is_set():
+                    pool_stop.set()
+                job.wait(POLL_INTERVAL)
+        results = [job.get() for job in jobs]
+    
+    elapsed = time.time() - start_time
+    attempts = sum(r[2] for r in results)
+    found = [r for r in results if r[0] is not None]
+    if found:
+        nonce, block_hash, _ = min(found)
+        block.nonce = nonce
+        block.hash = block_hash
+    
+    return attempts / elapsed if elapsed > 0 else 0.0
+
+
+# Mines block templates in a background thread until stopped. new_tip()
+# abandons the current template, so the next round builds on the new tip
+# and picks up the current mempool.
+class MiningService:
+    def __init__(self, blockchain, on_block=None):
+        self.blockchain = blockchain
+        self.on_block = on_block
+        self.miner_address = None
+        self.workers = 1
+        self.thread = None
+        self.running = False
+        self.blocks_mined = 0
+        self.started_at = None
+        self.interrupt = threading.Event()
+        self.lock = threading.Lock()
+        
+    def start(self, miner_address, workers):
+        with self.lock:
+            if self.running:
+                return False
+            self.miner_address = miner_address
+            self.workers = workers
+            self.running = True
+            self.started_at = time.time()
+            self.interrupt.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            return True
+        
+    def stop(self):
+        with self.lock:
+            if not self.running:
+                return False
+            self.running = False
+            self.interrupt.set()
+            thread = self.thread
+        thread.join()
+        return True
+    
+    def new_tip(self):
+        if self.running:
+            self.interrupt.set()
+            
+    def run(self):
+        while self.running:
+            self.interrupt.clear()
+            block = self.blockchain.create_block_template(self.miner_address)
+            if not self.blockchain.proof_of_work(block, self.workers, self.interrupt):
+                continue
+            try:
+                accepted = self.blockchain.add_block(block)
+            except ValueError as e:
+                print(f"[!] Mined block #{block.index} was rejected: {e}")
+                continue
+            if accepted:
+                self.blocks_mined += 1
+                print(f"[√] Mined block #{block.index}: {block.hash}")
+                if self.on_block:
+                    self.on_block(block)
+                    
+    def status(self):
+        latest = self.blockchain.get_latest_block()
+        return {
+            "running": self.running,
+            "miner_address": self.miner_address,
+            "workers": self.workers,
+            "hash_rate": round(self.blockchain.hash_rate, 2),
+            "blocks_mined": self.blocks_mined,
+            "uptime": round(time.time() - self.started_at, 2) if self.running else 0,
+            "height": latest.index,
+            "target": f"{self.blockchain.next_target():064x}"
+        }
@@ -0,0 +1,179 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Weight of the newest sample in the moving averages.
+SMOOTHING = 0.3
+
+class PeerHealth:
+    def __init__(self, latency=None, failure_rate=0.0, failures=0, last_seen=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failures = failures
+        self.last_seen = last_seen
+
+    def to_dict(self):
+        return {
+            "latency": self.latency,
+            "failure_rate": self.failure_rate,
+            "failures": self.failures,
+            "last_seen": self.last_seen
+        }
+
+# Known peers with a health record each, kept in a JSON file across
+# restarts. Iterating gives the best max_outbound peers, lowest score
+# first, so gossip and sync use those without knowing about scores. The
+# score is the average latency, inflated by the recent failure rate;
+# a peer never measured counts as half the timeout. A peer that fails
+# max_failures times in a row is dropped. The node's own URL is never
+# kept.
+class PeerManager:
+    def __init__(self, path, self_url, max_outbound, max_failures, timeout, probe_workers):
+        self.path = path
+        self.self_url = self_url
+        self.max_outbound = max_outbound
+        self.max_failures = max_failures
+        self.timeout = timeout
+        self.probe_workers = probe_workers
+        self.health = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.health = {url: PeerHealth(**record) for url, record in data.items() if url != self.self_url}
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[!] Ignoring unreadable peer file {self.path}: {e}")
+
+    # Saves come from request, probe and announce threads at once. Each
+    # write goes through its own temporary file, and save_lock keeps an
+    # older snapshot from replacing a newer one. The file is only a cache
+    # of peers to try, so a failed write is reported and otherwise ignored.
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                data = {url: health.to_dict() for url, health in self.health.items()}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path), suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, indent=1)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[!] Could not save the peer file {self.path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def add(self, url):
+        with self.lock:
+            if url == self.self_url or url in self.health:
+                return False
+            self.health[url] = PeerHealth()
+        self.save()
+        return True
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def discard(self, url):
+        with self.lock:
+            removed = self.health.pop(url, None) is not None
+        if removed:
+            self.save()
+
+    def __contains__(self, url):
+        return url in self.health
+
+    def __iter__(self):
+        return iter(self.known()[:self.max_outbound])
+
+    def score(self, health):
+        latency = self.timeout / 2 if health.latency is None else health.latency
+        return latency * (1 + 10 * health.failure_rate)
+
+    def known(self):
+        with self.lock:
+            return sorted(self.health, key=lambda url: self.score(self.health[url]))
+
+    def record_success(self, url, latency):
+        with self.lock:
+            health = self.health.get(url)
+            if health is None:
+                return
+            health.latency = latency if health.latency is None else (
+                SMOOTHING * latency + (1 - SMOOTHING) * health.latency)
+            health.failure_rate *= 1 - SMOOTHING
+            health.failures = 0
+            health.last_seen = time.time()
+
+    def record_failure(self, url):
+        with self.lock:
+            health = self.health.get(url)
+            if health is None:
+                return
+            health.failure_rate = SMOOTHING + (1 - SMOOTHING) * health.failure_rate
+            health.failures += 1
+            dead = health.failures >= self.max_failures
+            if dead:
+                del self.health[url]
+        if dead:
+            print(f"[-] Dropped peer {url} after {self.max_failures} failures in a row")
+
+    def ping(self, transport, url):
+        start = time.perf_counter()
+        try:
+            transport.ping(url)
+        except Exception:
+            self.record_failure(url)
+            return False
+        self.record_success(url, time.perf_counter() - start)
+        return True
+
+    # Pings every known peer at once, not only the ones in use, so a peer
+    # that recovers can win its place back.
+    def probe(self, transport):
+        urls = self.known()
+        if urls:
+            with ThreadPoolExecutor(min(self.probe_workers, len(urls))) as pool:
+                list(pool.map(lambda url: self.ping(transport, url), urls))
+            self.save()
+        return urls
+
+    def notify(self, transport, url):
+        start = time.perf_counter()
+        try:
+            their_peers = transport.post_json(url, "/peer/announce", {"peer": self.self_url}).get("peers", [])
+        except Exception as e:
+            self.record_failure(url)
+            print(f"[!] Could not notify {url}: {e}")
+            return
+        self.add(url)
+        self.record_success(url, time.perf_counter() - start)
+        self.update(their_peers)
+        print(f"[>] Notified {url}, received peeers: {their_peers}")
+
+    # Announces this node to the bootstrap nodes and to every peer kept from
+    # the last run, all at once, so unreachable ones cost one timeout in total.
+    def announce(self, transport, bootstrap_peers):
+        urls = (set(bootstrap_peers) | set(self.known())) - {self.self_url}
+        if urls:
+            with ThreadPoolExecutor(min(self.probe_workers, len(urls))) as pool:
+                list(pool.map(lambda url: self.notify(transport, url), urls))
+
+    def status(self):
+        known = self.known()
+        with self.lock:
+            return [
+                dict(self.health[url].to_dict(), peer=url, score=self.score(self.health[url]),
+                     outbound=i < self.max_outbound)
+                for i, url in enumerate(known) if url in self.health
+            ]
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+
+# Balances of every account after the block at height, committed to by a
+# hash over the height, the block hash and the sorted balances.
+class Snapshot:
+    def __init__(self, height, block_hash, balances, snapshot_hash=None):
+        self.height = height
+        self.block_hash = block_hash
+        self.balances = balances
+        self.hash = snapshot_hash or self.calculate_hash()
+
+    def calculate_hash(self):
+        data = json.dumps({
+            "height": self.height,
+            "block_hash": self.block_hash,
+            "balances": self.balances
+        }, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def is_valid(self):
+        return self.hash == self.calculate_hash()
+
+    def to_dict(self):
+        return {
+            "height": self.height,
+            "block_hash": self.block_hash,
+            "balances": self.balances,
+            "hash": self.hash
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["height"], data["block_hash"], data["balances"], data["hash"])
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                snapshot = cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[!] Ignoring unreadable snapshot {path}: {e}")
+            return None
+        if not snapshot.is_valid():
+            print(f"[!] Ignoring snapshot {path}: hash does not match its balances")
+            return None
+        return snapshot
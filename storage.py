@@ -0,0 +1,217 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+import metrics
+
+RECORD_HEADER = struct.Struct(">II")
+
+def encode_record(payload):
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+class BlockStore:
+    def __init__(self, path, fsync_every=1):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.offsets = []
+        self.unsynced = 0
+        self.map = None
+        self.file = open(path, "a+b")
+        self.recover()
+        
+    # Only the record lengths are walked on open; the checksum of the last
+    # record is verified to detect a torn write, the rest are read lazily.
+    def recover(self):
+        self.close_map()
+        self.offsets = []
+        size = os.fstat(self.file.fileno()).st_size
+        offset = 0
+        if size:
+            data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                while offset + RECORD_HEADER.size <= size:
+                    length, _ = RECORD_HEADER.unpack_from(data, offset)
+                    if offset + RECORD_HEADER.size + length > size:
+                        break
+                    self.offsets.append(offset)
+                    offset += RECORD_HEADER.size + length
+                    
+                if self.offsets:
+                    last = self.offsets[-1]
+                    length, checksum = RECORD_HEADER.unpack_from(data, last)
+                    payload = data[last + RECORD_HEADER.size:last + RECORD_HEADER.size + length]
+                    if zlib.crc32(payload) != checksum:
+                        self.offsets.pop()
+                        offset = last
+            finally:
+                data.close()
+                
+        if offset != size:
+            print(f"[!] Discarding torn record at offset {offset} in {self.path}")
+            self.file.truncate(offset)
+            self.sync()
+        self.end = offset
+        
+    def __len__(self):
+        return len(self.offsets)
+    
+    def __iter__(self):
+        for i in range(len(self.offsets)):
+            yield self.read(i)
+            
+    # A map outgrown by appends is replaced rather than closed, since another
+    # thread may still be reading from it; it is released once unreferenced.
+    def read(self, i):
+        data = self.map
+        if data is None or len(data) < self.end:
+            data = self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = self.offsets[i]
+        length, _ = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        return data[start:start + length]
+    
+    @metrics.timed(metrics.BLOCK_SAVE_SECONDS)
+    def append(self, payload):
+        record = encode_record(payload)
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(record)
+        self.file.flush()
+        self.offsets.append(self.end)
+        self.end += len(record)
+        
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+            
+    def truncate(self, count):
+        if count >= len(self.offsets):
+            return
+        self.close_map()
+        self.end = self.offsets[count]
+        del self.offsets[count:]
+        self.file.truncate(self.end)
+        self.sync()
+        
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        
+    def rewrite(self, payloads):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for payload in payloads:
+                f.write(encode_record(payload))
+            f.flush()
+            os.fsync(f.fileno())
+        self.close_map()
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a+b")
+        self.unsynced = 0
+        self.recover()
+        
+    def close_map(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            
+    def close(self):
+        self.sync()
+        self.close_map()
+        self.file.close()
+
+# Sequence view over a BlockStore. Only the tip is decoded eagerly; other
+# blocks are decoded from the memory-mapped file on access and kept in a
+# small LRU cache (or all of them when cache_size is None). With an archive,
+# every block below the tip is loaded into it up front instead of the cache.
+# Readers share the chain's read lock, so the cache has a lock of its own;
+# blocks are decoded outside it.
+class LazyChain:
+    def __init__(self, store, decode, encode, cache_size=256, archive=None):
+        self.store = store
+        self.decode = decode
+        self.encode = encode
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.archive = archive
+        self.tip = decode(store.read(-1)) if len(store) else None
+        if archive is not None:
+            for i in range(len(store) - 1):
+                archive.append(decode(store.read(i)))
+        elif cache_size is None:
+            for i in range(len(store) - 1):
+                self.cache[i] = decode(store.read(i))
+        
+    def __len__(self):
+        return len(self.store)
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+            
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        
+        length = len(self)
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("block index out of range")
+        if i == length - 1:
+            return self.tip
+        if self.archive is not None:
+            return self.archive[i]
+        
+        with self.cache_lock:
+            block = self.cache.get(i)
+            if block is not None:
+                self.cache.move_to_end(i)
+                return block
+        block = self.decode(self.store.read(i))
+        with self.cache_lock:
+            self.cache[i] = block
+            if self.cache_size is not None and len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return block
+    
+    def append(self, block):
+        self.store.append(self.encode(block))
+        if self.tip is not None and self.archive is not None:
+            self.archive.append(self.tip)
+        elif self.tip is not None and self.cache_size is None:
+            self.cache[len(self) - 2] = self.tip
+        self.tip = block
+        
+    def truncate(self, length):
+        self.store.truncate(length)
+        if self.archive is not None:
+            self.archive.truncate(length - 1)
+        with self.cache_lock:
+            for i in [i for i in self.cache if i >= length - 1]:
+                del self.cache[i]
+        self.tip = self.decode(self.store.read(-1)) if len(self.store) else None
+        
+    # Rewrites the store with transform applied to the blocks in [start,
+    # end), streaming record by record; every other record is copied as it
+    # is, so only the transformed blocks are ever decoded.
+    def rewrite(self, start, end, transform):
+        def payloads():
+            for i in range(len(self.store)):
+                payload = self.store.read(i)
+                yield self.encode(transform(self.decode(payload))) if start <= i < end else payload
+        
+        self.store.rewrite(payloads())
+        with self.cache_lock:
+            for i in [i for i in self.cache if start <= i < end]:
+                del self.cache[i]
+        if len(self.store) and end >= len(self.store):
+            self.tip = self.decode(self.store.read(-1))
+        if self.archive is not None:
+            self.archive.clear()
+            for i in range(len(self.store) - 1):
+                self.archive.append(self.decode(self.store.read(i)))
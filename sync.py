@@ -0,0 +1,229 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import codec
+from blockchain import Block, block_work, header_is_valid
+from transaction import verify_batch
+from snapshot import Snapshot
+import config
+import metrics
+
+# Peer I/O goes through a transport, so the same sync flow runs over
+# blocking requests here or over the ASGI server's event loop
+# (async_peers.LoopTransport). Every call raises on a network error or an
+# error status.
+class HttpTransport:
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def get_json(self, peer, path, params=None):
+        response = requests.get(f"{peer}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        metrics.SYNC_BYTES.inc(len(response.content))
+        return response.json()
+
+    def post_json(self, peer, path, data):
+        response = requests.post(f"{peer}{path}", json=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def ping(self, peer):
+        requests.get(f"{peer}/ping", timeout=self.timeout).raise_for_status()
+
+    # Yields the payload of each frame of a binary response as it arrives.
+    def stream_frames(self, peer, path, params):
+        with requests.get(f"{peer}{path}", params=params, headers={"Accept": codec.MIME_TYPE},
+                          stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for payload in codec.iter_frames(response.raw):
+                metrics.SYNC_BYTES.inc(len(payload))
+                yield payload
+
+# Yields (start, headers) a batch at a time up to target_height, asking
+# for each batch from the last header of the one before.
+def iter_headers(transport, peer, locator, target_height):
+    while True:
+        data = transport.get_json(peer, "/headers", {
+            "locator": ",".join(f"{height}:{block_hash}" for height, block_hash in locator),
+            "limit": config.SYNC_HEADERS_LIMIT
+        })
+        if not data["headers"]:
+            return
+        yield data["start"], data["headers"]
+        last = data["headers"][-1]
+        if last["index"] >= target_height:
+            return
+        locator = [(last["index"], last["hash"])]
+
+# Bodies are checked against the headers they were announced with; version 1
+# blocks never committed to signatures, so only newer ones are verified.
+def block_matches_header(block, header):
+    if block.hash != header["hash"] or block.calculate_hash() != header["hash"]:
+        return False
+    if block.version >= 2 and not all(verify_batch(block.transaction)):
+        return False
+    return True
+
+# Each range is checked block by block while it streams in, so a peer
+# serving a bad body is dropped without reading the rest of its range.
+def fetch_range(transport, peer, headers):
+    blocks = []
+    frames = transport.stream_frames(peer, "/chain", {"from": headers[0]["index"], "limit": len(headers)})
+    try:
+        for payload in frames:
+            if len(blocks) == len(headers):
+                break
+            header = headers[len(blocks)]
+            block = Block.from_bytes(payload)
+            if not block_matches_header(block, header):
+                print(f"[!] Block #{header['index']} from {peer} does not match its header")
+                return None
+            blocks.append(block)
+    finally:
+        frames.close()
+    return blocks if len(blocks) == len(headers) else None
+
+def fetch_snapshot(transport, peer):
+    return Snapshot.from_dict(transport.get_json(peer, "/snapshot"))
+
+# Validates a peer's headers from height start onwards, one batch at a
+# time, carrying the parent and retarget window from batch to batch.
+class HeaderChecker:
+    def __init__(self, blockchain, peer, start):
+        self.peer = peer
+        self.previous = blockchain.chain[start - 1].header_dict()
+        self.window = deque(blockchain.retarget_window(start), maxlen=config.RETARGET_WINDOW + 1)
+
+    def check(self, headers):
+        for header in headers:
+            if not header_is_valid(header, self.previous, list(self.window)):
+                print(f"[!] Invalid header #{header.get('index')} from {self.peer}")
+                return False
+            self.previous = header
+            self.window.append((header["timestamp"], int(header["target"], 16)))
+        return True
+
+# Pruned peers only serve bodies from the height they advertise in /tip, so
+# older ranges are fetched from a peer that still has them.
+def body_source(peer, tip, tips, height):
+    for source, source_tip in [(peer, tip)] + tips:
+        if source_tip.get("bodies_from", 0) <= height:
+            return source
+    return None
+
+# Fetches the bodies for headers from start onwards in parallel ranges.
+# Blocks that extend the tip are applied range by range as they arrive;
+# a fork replaces our blocks in one reorganize. Returns False if a range
+# could not be fetched.
+def apply_headers(blockchain, transport, peer, tip, tips, pool, start, headers):
+    ranges = []
+    for i in range(0, len(headers), config.SYNC_RANGE_SIZE):
+        chunk = headers[i:i + config.SYNC_RANGE_SIZE]
+        source = body_source(peer, tip, list(tips), chunk[0]["index"])
+        if source is None:
+            print(f"[!] No known peer serves block bodies from height {chunk[0]['index']}")
+            return False
+        ranges.append((source, chunk))
+    chunks = pool.map(lambda item: fetch_range(transport, *item), ranges)
+    
+    if start == len(blockchain.chain):
+        for (_, chunk), blocks in zip(ranges, chunks):
+            if blocks is None:
+                return False
+            blockchain.reorganize(chunk[0]["index"], blocks)
+        return True
+    
+    chunks = list(chunks)
+    if any(blocks is None for blocks in chunks):
+        return False
+    blockchain.reorganize(start, [block for blocks in chunks for block in blocks])
+    return True
+
+# Headers are validated and their bodies applied a batch at a time, so a
+# fresh node never holds the peer's whole chain. Headers of a fork are
+# held back only until they carry more work than our blocks since the
+# fork; from then on the peer's chain is ours and later batches extend it.
+def sync_from_peer(blockchain, transport, peer, tip, pool, tips=()):
+    checker = None
+    start = None
+    pending = []
+    synced = False
+    for batch_start, headers in iter_headers(transport, peer, blockchain.build_locator(), tip["height"]):
+        if checker is None:
+            if batch_start < 1:
+                return False
+            start = batch_start
+            checker = HeaderChecker(blockchain, peer, start)
+        if not checker.check(headers):
+            return synced
+        pending.extend(headers)
+        
+        work = sum(block_work(int(header["target"], 16)) for header in pending)
+        if work <= blockchain.work_since(start):
+            continue
+        if not apply_headers(blockchain, transport, peer, tip, tips, pool, start, pending):
+            return synced
+        synced = True
+        start += len(pending)
+        pending = []
+    return synced
+
+@metrics.timed(metrics.SYNC_SECONDS)
+def sync_with_peers(blockchain, transport, peers):
+    def try_tip(peer):
+        try:
+            return peer, transport.get_json(peer, "/tip")
+        except Exception as e:
+            print(f"Error syncing with {peer}: {str(e)}")
+            return peer, None
+        
+    with ThreadPoolExecutor(config.SYNC_WORKERS) as pool:
+        tips = [(peer, tip) for peer, tip in pool.map(try_tip, list(peers)) if tip]
+        tips.sort(key=lambda item: int(item[1]["work"], 16), reverse=True)
+        
+        # Peers are tried heaviest first, and only while they claim more
+        # work than our chain has.
+        for peer, tip in tips:
+            if int(tip["work"], 16) <= blockchain.tip.work:
+                break
+            try:
+                if sync_from_peer(blockchain, transport, peer, tip, pool, tips):
+                    return True
+            except Exception as e:
+                print(f"Error syncing with {peer}: {str(e)}")
+    return False
+
+# A snapshot is accepted when its block lies on a valid header chain that
+# extends ours, so forging one means redoing the proof of work up to it.
+# Its balances are only trusted until the bodies have been replayed.
+def bootstrap_from_peer(blockchain, transport, peer):
+    snapshot = fetch_snapshot(transport, peer)
+    if not snapshot.is_valid() or snapshot.height < len(blockchain.chain):
+        return False
+    
+    checker = None
+    for start, headers in iter_headers(transport, peer, blockchain.build_locator(), snapshot.height):
+        if checker is None:
+            if start != len(blockchain.chain):
+                return False
+            checker = HeaderChecker(blockchain, peer, start)
+        if not checker.check(headers):
+            return False
+        if checker.previous["index"] >= snapshot.height:
+            break
+    
+    header = next((header for header in headers if header["index"] == snapshot.height), None) if checker else None
+    if header is None or header["hash"] != snapshot.block_hash:
+        print(f"[!] Snapshot from {peer} is not on its header chain")
+        return False
+    return blockchain.install_snapshot(snapshot)
+
+def bootstrap_with_peers(blockchain, transport, peers):
+    for peer in list(peers):
+        try:
+            if bootstrap_from_peer(blockchain, transport, peer):
+                print(f"[√] Bootstrapped balances from {peer} at height {blockchain.bootstrap.height}")
+                return True
+        except Exception as e:
+            print(f"Error bootstrapping from {peer}: {str(e)}")
+    return False
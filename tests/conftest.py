@@ -0,0 +1,49 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+CHAIN_JSON = os.path.join(ROOT, "chain.json")
+
+import config
+from blockchain import Blockchain, Block
+from transaction import Transaction
+from wallet import generate_keypair, get_address_from_public_key
+
+# Chains are built in a temporary directory at difficulty 1 with a one
+# second target, with blocks one second apart, so they stay valid without
+# real proof-of-work.
+
+@pytest.fixture
+def blockchain(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BLOCKS_FILE", str(tmp_path / "chain.dat"))
+    monkeypatch.setattr(config, "CHAIN_FILE", str(tmp_path / "chain.json"))
+    monkeypatch.setattr(config, "TX_INDEX_FILE", str(tmp_path / "index.db"))
+    monkeypatch.setattr(config, "SNAPSHOT_FILE", str(tmp_path / "snapshot.json"))
+    monkeypatch.setattr(config, "PRUNE_KEEP_BLOCKS", 0)
+    monkeypatch.setattr(config, "INITIAL_DIFFICULTY", 1)
+    monkeypatch.setattr(config, "TARGET_BLOCK_TIME", 1)
+    chain = Blockchain()
+    chain.mining_workers = 1
+    yield chain
+    if chain.tx_index is not None:
+        chain.tx_index.close()
+
+def make_wallet():
+    key = generate_keypair()[0]
+    return key, get_address_from_public_key(key.public_key())
+
+def signed(key, sender, recipient, amount, fee=0):
+    tx = Transaction(sender, recipient, amount, fee=fee)
+    tx.sign(key)
+    return tx
+
+def make_block(blockchain, txs, parent=None):
+    parent = parent or blockchain.chain[-1]
+    block = Block(parent.index + 1, parent.timestamp + 1, txs, parent.hash, target=blockchain.next_target())
+    blockchain.proof_of_work(block, 1)
+    return block
+
+def reward(address, amount=10):
+    return Transaction("SYSTEM", address, amount)
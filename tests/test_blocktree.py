@@ -0,0 +1,57 @@
+import random
+import threading
+import pytest
+from blocktree import BlockTree
+from conftest import make_block, reward
+
+def chain_of(blockchain, count, miner="miner"):
+    blocks = []
+    parent = blockchain.chain[-1]
+    for _ in range(count):
+        parent = make_block(blockchain, [reward(miner)], parent)
+        blocks.append(parent)
+    return blocks
+
+def test_orphans_connect_when_the_parent_arrives(blockchain):
+    tree = BlockTree(blockchain, 10, 10)
+    first, second, third = chain_of(blockchain, 3)
+    assert tree.receive(third) == "orphan"
+    assert tree.receive(second) == "orphan"
+    assert tree.receive(first) == "extended"
+    assert blockchain.tip.height == 3
+    assert not tree.orphans
+
+def test_orphans_need_proof_of_work(blockchain):
+    tree = BlockTree(blockchain, 10, 10)
+    _, orphan = chain_of(blockchain, 2)
+    orphan.hash = "0" * 64
+    with pytest.raises(ValueError, match="does not match"):
+        tree.receive(orphan)
+
+    _, orphan = chain_of(blockchain, 2)
+    orphan.target = blockchain.get_latest_block().target * 4 + 1
+    with pytest.raises(ValueError, match="easier"):
+        tree.receive(orphan)
+    assert not tree.orphans
+
+def test_concurrent_receive(blockchain):
+    tree = BlockTree(blockchain, 50, 50)
+    blocks = chain_of(blockchain, 40)
+    order = blocks[1:]
+    random.Random(7).shuffle(order)
+    errors = []
+
+    def receive(block):
+        try:
+            tree.receive(block)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=receive, args=(block,)) for block in order + blocks[:1]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert blockchain.tip.height == 40
+    assert not tree.orphans
@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import config
+from blockchain import Blockchain, Block
+from conftest import CHAIN_JSON, make_block, reward
+
+def test_fresh_chains_share_a_genesis_block(blockchain, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BLOCKS_FILE", str(tmp_path / "other.dat"))
+    monkeypatch.setattr(config, "TX_INDEX_FILE", str(tmp_path / "other.db"))
+    other = Blockchain()
+    assert other.chain[0].hash == blockchain.chain[0].hash
+    
+    assert blockchain.add_block(make_block(blockchain, [reward("miner")]))
+    assert other.find_fork_point(blockchain.build_locator()) == 0
+
+def test_reopening_reads_work_from_the_index(blockchain, monkeypatch):
+    for _ in range(40):
+        assert blockchain.add_block(make_block(blockchain, [reward("miner")]))
+    work = blockchain.tip.work
+    blockchain.tx_index.close()
+    
+    decoded = []
+    from_record = Block.from_record.__func__
+    monkeypatch.setattr(Block, "from_record", classmethod(lambda cls, payload: decoded.append(1) or from_record(cls, payload)))
+    reopened = Blockchain()
+    assert reopened.tip.work == work
+    assert len(decoded) < 20
+    reopened.tx_index.close()
+
+def test_index_without_work_is_rebuilt(blockchain):
+    assert blockchain.add_block(make_block(blockchain, [reward("miner")]))
+    work = blockchain.tip.work
+    blockchain.tx_index.close()
+    db = sqlite3.connect(config.TX_INDEX_FILE)
+    db.executescript("DROP TABLE blocks; CREATE TABLE blocks (height INTEGER PRIMARY KEY, hash TEXT NOT NULL);")
+    db.close()
+    
+    reopened = Blockchain()
+    assert reopened.tx_index.work(1) == work
+    reopened.tx_index.close()
+
+def test_pruning_streams_only_the_newly_pruned_blocks(blockchain, monkeypatch):
+    monkeypatch.setattr(config, "PRUNE_KEEP_BLOCKS", 1)
+    monkeypatch.setattr(config, "MAX_REORG_DEPTH", 3)
+    monkeypatch.setattr(config, "SNAPSHOT_INTERVAL", 5)
+    for _ in range(33):
+        assert blockchain.add_block(make_block(blockchain, [reward("miner")]))
+    assert blockchain.pruned_height == 30
+    
+    decoded = []
+    decode = blockchain.chain.decode
+    blockchain.chain.decode = lambda payload: decoded.append(1) or decode(payload)
+    for _ in range(5):
+        assert blockchain.add_block(make_block(blockchain, [reward("miner")]))
+    assert blockchain.pruned_height == 35
+    assert len(decoded) < 20
+    
+    assert all(blockchain.chain[i].pruned for i in range(35))
+    assert not any(blockchain.chain[i].pruned for i in range(35, 39))
+    assert blockchain.get_balance("miner") == 380
+    blockchain.tx_index.close()
+    reopened = Blockchain()
+    assert reopened.pruned_height == 35
+    assert reopened.get_balance("miner") == 380
+    reopened.tx_index.close()
+
+def test_chain_json_is_migrated_once(blockchain, tmp_path, monkeypatch):
+    with open(CHAIN_JSON) as f:
+        hashes = [block["hash"] for block in json.load(f)]
+    monkeypatch.setattr(config, "CHAIN_FILE", CHAIN_JSON)
+    monkeypatch.setattr(config, "BLOCKS_FILE", str(tmp_path / "migrated.dat"))
+    monkeypatch.setattr(config, "TX_INDEX_FILE", str(tmp_path / "migrated.db"))
+    migrated = Blockchain()
+    assert [block.hash for block in migrated.chain] == hashes
+    migrated.tx_index.close()
+    
+    # The block file exists now, so the next start reads it instead.
+    monkeypatch.setattr(Blockchain, "load_chain_from_file", None)
+    reopened = Blockchain()
+    assert [block.hash for block in reopened.chain] == hashes
+    reopened.tx_index.close()
@@ -0,0 +1,37 @@
+import pytest
+import codec
+import config
+import validation
+from blockchain import Block
+from conftest import make_block, make_wallet, reward
+
+def test_block_round_trips_through_bytes(blockchain):
+    block = make_block(blockchain, [reward("miner")])
+    decoded = Block.from_bytes(block.to_bytes())
+    assert decoded.hash == block.hash
+    assert [tx.txid for tx in decoded.transaction] == [tx.txid for tx in block.transaction]
+
+def test_pruned_blocks_are_only_read_from_the_store(blockchain):
+    pruned = make_block(blockchain, [reward("miner")]).without_body()
+    with pytest.raises(ValueError):
+        Block.from_bytes(pruned.to_bytes())
+    with pytest.raises(ValueError):
+        Block.from_dict(pruned.to_dict())
+    assert Block.from_record(pruned.to_bytes()).pruned
+    assert codec.decode_block(pruned.to_bytes(), allow_pruned=True)["pruned_root"] == pruned.merkle_root
+
+# An honest header with a claimed Merkle root must not carry a different body.
+def test_pruned_root_cannot_swap_the_body(blockchain):
+    _, a = make_wallet()
+    _, b = make_wallet()
+    block = make_block(blockchain, [reward(a)])
+    forged = block.to_dict()
+    forged["pruned_root"] = block.merkle_root
+    forged["transactions"] = [reward(b).to_signed_dict()]
+    with pytest.raises(ValueError):
+        Block.from_dict(forged)
+    
+    with pytest.raises(ValueError, match="no body"):
+        validation.check_structure(block.without_body(), config.MAX_BLOCK_TXS, config.MAX_BLOCK_BYTES)
+    assert blockchain.add_block(block)
+    assert blockchain.get_balance(a) == 10
@@ -0,0 +1,80 @@
+import pytest
+from mempool import Mempool, transaction_size
+from transaction import Transaction
+from conftest import make_block, make_wallet, reward, signed
+
+def test_block_spending_queued_funds_drops_the_queued_spend(blockchain):
+    key, sender = make_wallet()
+    assert blockchain.add_block(make_block(blockchain, [reward(sender)]))
+    blockchain.add_transaction(signed(key, sender, "B", 10))
+    
+    # A peer's block spends the same 10 elsewhere.
+    assert blockchain.add_block(make_block(blockchain, [signed(key, sender, "C", 10), reward("peer")]))
+    assert len(blockchain.mempool) == 0
+    assert blockchain.mine_pending_transactions("miner")
+    assert blockchain.get_balance("B") == 0
+
+def test_reorganize_drops_spends_the_new_chain_does_not_fund(blockchain):
+    key, sender = make_wallet()
+    funding = make_block(blockchain, [reward(sender)])
+    assert blockchain.add_block(funding)
+    blockchain.add_transaction(signed(key, sender, "B", 4))
+    
+    fork = [make_block(blockchain, [reward("other")], blockchain.chain[0])]
+    fork.append(make_block(blockchain, [reward("other")], fork[0]))
+    blockchain.reorganize(1, fork)
+    assert len(blockchain.mempool) == 0
+    assert blockchain.mine_pending_transactions("miner")
+
+def tx(sender, amount, fee=0, recipient="r"):
+    return Transaction(sender, recipient, amount, fee=fee)
+
+def test_duplicates_are_rejected():
+    mempool = Mempool(10_000, 60)
+    mempool.add(tx("a", 5))
+    with pytest.raises(ValueError, match="Duplicate"):
+        mempool.add(tx("a", 5))
+    assert len(mempool) == 1
+
+def test_lowest_fee_rate_is_evicted_first():
+    cheap, dear, newer = tx("a", 1, fee=1), tx("b", 1, fee=9), tx("c", 1, fee=1)
+    mempool = Mempool(transaction_size(cheap) + transaction_size(dear), 60)
+    mempool.add(cheap)
+    mempool.add(dear)
+    # Same fee rate as cheap but newer, so it is the one dropped.
+    with pytest.raises(ValueError, match="fee is too low"):
+        mempool.add(newer)
+    assert cheap.txid in mempool and dear.txid in mempool
+    
+    evicted = mempool.add(tx("d", 1, fee=5))
+    assert [t.txid for t in evicted] == [cheap.txid]
+    assert mempool.total_bytes <= mempool.max_bytes
+
+def test_expire_drops_old_entries():
+    mempool = Mempool(10_000, 60)
+    old = tx("a", 1)
+    mempool.add(old)
+    mempool.by_txid[old.txid].added -= 120
+    mempool.add(tx("b", 1))
+    assert [t.txid for t in mempool.expire()] == [old.txid]
+    assert len(mempool) == 1
+
+def test_spent_by_tracks_queued_amounts_and_fees():
+    mempool = Mempool(10_000, 60)
+    first, second = tx("a", 5, fee=1), tx("a", 3, fee=2)
+    mempool.add(first)
+    mempool.add(second)
+    assert mempool.spent_by("a") == 11
+    mempool.remove([first.txid])
+    assert mempool.spent_by("a") == 5
+    mempool.remove([second.txid])
+    assert mempool.spent_by("a") == 0
+    assert "a" not in mempool.by_sender
+
+def test_select_orders_by_fee_rate_within_limits():
+    mempool = Mempool(10_000, 60)
+    low, high, mid = tx("a", 1, fee=1), tx("b", 1, fee=9), tx("c", 1, fee=5)
+    for t in (low, high, mid):
+        mempool.add(t)
+    assert [t.txid for t in mempool.select(2, 10_000)] == [high.txid, mid.txid]
+    assert [t.txid for t in mempool.select(3, transaction_size(high))] == [high.txid]
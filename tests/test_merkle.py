@@ -0,0 +1,34 @@
+import hashlib
+import pytest
+from transaction import merkle_parent, merkle_proof, merkle_root, verify_merkle_proof
+
+def leaves(count):
+    return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 6, 7, 9, 16, 17])
+def test_every_leaf_proves_against_the_root(count):
+    txids = leaves(count)
+    root = merkle_root(txids)
+    for i, txid in enumerate(txids):
+        assert verify_merkle_proof(txid, merkle_proof(txids, i), root)
+
+def test_odd_leaf_is_promoted_not_duplicated():
+    a, b, c = leaves(3)
+    assert merkle_root([a, b, c]) == merkle_parent(merkle_parent(a, b), c)
+    # Duplicating the last leaf would let [a, b, c, c] share the root.
+    assert merkle_root([a, b, c, c]) != merkle_root([a, b, c])
+    assert merkle_proof([a, b, c], 2) == [{"hash": merkle_parent(a, b), "position": "left"}]
+
+def test_proof_fails_for_another_leaf_or_root():
+    txids = leaves(5)
+    root = merkle_root(txids)
+    proof = merkle_proof(txids, 4)
+    assert not verify_merkle_proof(txids[3], proof, root)
+    assert not verify_merkle_proof(txids[4], proof, merkle_root(txids[:4]))
+    assert not verify_merkle_proof(txids[4], [{"hash": "zz", "position": "left"}], root)
+    assert not verify_merkle_proof(txids[4], [{"position": "left"}], root)
+
+def test_single_leaf_is_its_own_root():
+    (txid,) = leaves(1)
+    assert merkle_root([txid]) == txid
+    assert merkle_proof([txid], 0) == []
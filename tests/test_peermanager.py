@@ -0,0 +1,88 @@
+import json
+import threading
+from peermanager import PeerManager
+
+def make_manager(tmp_path, **kwargs):
+    options = dict(max_outbound=8, max_failures=3, timeout=2.0, probe_workers=4)
+    options.update(kwargs)
+    return PeerManager(str(tmp_path / "peers.json"), "http://localhost:5000", **options)
+
+def test_concurrent_saves(tmp_path):
+    manager = make_manager(tmp_path)
+    errors = []
+    
+    def add(port):
+        try:
+            manager.add(f"http://localhost:{port}")
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=add, args=(6000 + i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    with open(tmp_path / "peers.json") as f:
+        assert len(json.load(f)) == 16
+    assert [path.name for path in tmp_path.iterdir()] == ["peers.json"]
+
+class FakeTransport:
+    def __init__(self, down=()):
+        self.down = set(down)
+
+    def ping(self, url):
+        if url in self.down:
+            raise ConnectionError(url)
+
+def test_peers_are_ordered_by_score(tmp_path):
+    manager = make_manager(tmp_path, max_outbound=2)
+    for url in ("http://a", "http://b", "http://c", "http://d"):
+        manager.add(url)
+    manager.record_success("http://a", 0.3)
+    manager.record_success("http://b", 0.1)
+    manager.record_success("http://c", 0.1)
+    manager.record_failure("http://c")
+    # c's failure rate of 0.3 scores it 0.1 * 4; d was never measured and
+    # counts as half the timeout.
+    assert manager.known() == ["http://b", "http://a", "http://c", "http://d"]
+    assert list(manager) == ["http://b", "http://a"]
+    assert [row["outbound"] for row in manager.status()] == [True, True, False, False]
+
+def test_latency_is_a_moving_average(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.add("http://a")
+    manager.record_success("http://a", 1.0)
+    manager.record_success("http://a", 0.0)
+    assert manager.health["http://a"].latency == 0.7
+
+def test_peer_is_dropped_after_repeated_failures(tmp_path):
+    manager = make_manager(tmp_path, max_failures=3)
+    manager.add("http://a")
+    manager.add("http://b")
+    transport = FakeTransport(down={"http://a"})
+    manager.probe(transport)
+    manager.probe(transport)
+    assert "http://a" in manager
+    assert manager.health["http://a"].failures == 2
+    
+    transport.down.clear()
+    manager.probe(transport)
+    assert manager.health["http://a"].failures == 0
+    
+    transport.down.add("http://a")
+    for _ in range(3):
+        manager.probe(transport)
+    assert "http://a" not in manager
+    assert "http://b" in manager
+
+def test_health_survives_a_restart_without_our_own_url(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.add("http://a")
+    manager.add("http://localhost:5000")
+    manager.record_success("http://a", 0.2)
+    manager.save()
+    
+    reopened = make_manager(tmp_path)
+    assert reopened.known() == ["http://a"]
+    assert reopened.health["http://a"].latency == 0.2
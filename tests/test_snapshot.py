@@ -0,0 +1,68 @@
+import json
+import config
+from blockchain import Blockchain
+from snapshot import Snapshot
+from conftest import make_block, reward
+
+def mine(chain, count, miner="miner"):
+    blocks = []
+    for _ in range(count):
+        blocks.append(make_block(chain, [reward(miner)]))
+        assert chain.add_block(blocks[-1])
+    return blocks
+
+def fresh_chain(monkeypatch):
+    monkeypatch.setattr(config, "BLOCKS_FILE", config.BLOCKS_FILE + ".fresh")
+    monkeypatch.setattr(config, "TX_INDEX_FILE", config.TX_INDEX_FILE + ".fresh")
+    return Blockchain()
+
+def test_hash_covers_height_block_and_balances(tmp_path):
+    snapshot = Snapshot(3, "ab" * 32, {"a": 10, "b": 5})
+    assert snapshot.is_valid()
+    assert Snapshot.from_dict(snapshot.to_dict()).hash == snapshot.hash
+    for changed in (Snapshot(4, "ab" * 32, {"a": 10, "b": 5}), Snapshot(3, "ab" * 32, {"a": 11, "b": 5})):
+        assert changed.hash != snapshot.hash
+    
+    path = str(tmp_path / "snapshot.json")
+    snapshot.save(path)
+    assert Snapshot.load(path).hash == snapshot.hash
+    data = snapshot.to_dict()
+    data["balances"]["a"] = 1000
+    with open(path, "w") as f:
+        json.dump(data, f)
+    assert Snapshot.load(path) is None
+
+def test_installed_snapshot_is_verified_by_replay(blockchain, monkeypatch):
+    blocks = mine(blockchain, 6)
+    snapshot = Snapshot(6, blocks[-1].hash, dict(blockchain.ledger.balances))
+    blockchain.tx_index.close()
+    
+    fresh = fresh_chain(monkeypatch)
+    assert fresh.install_snapshot(snapshot)
+    assert fresh.get_balance("miner") == 60
+    for block in blocks:
+        assert fresh.add_block(block)
+    assert fresh.bootstrap is None
+    assert fresh.snapshot.hash == snapshot.hash
+    assert Snapshot.load(config.SNAPSHOT_FILE).hash == snapshot.hash
+    fresh.tx_index.close()
+
+def test_snapshot_that_disagrees_with_the_replay_is_discarded(blockchain, monkeypatch):
+    blocks = mine(blockchain, 4)
+    blockchain.tx_index.close()
+    
+    fresh = fresh_chain(monkeypatch)
+    forged = Snapshot(4, blocks[-1].hash, {"miner": 40, "thief": 1000})
+    assert fresh.install_snapshot(forged)
+    assert fresh.get_balance("thief") == 1000
+    for block in blocks:
+        assert fresh.add_block(block)
+    assert fresh.bootstrap is None
+    assert fresh.snapshot is None or fresh.snapshot.hash != forged.hash
+    assert fresh.get_balance("thief") == 0
+    fresh.tx_index.close()
+
+def test_snapshot_below_the_tip_is_not_installed(blockchain):
+    blocks = mine(blockchain, 3)
+    assert not blockchain.install_snapshot(Snapshot(2, blocks[1].hash, {"miner": 20}))
+    assert blockchain.bootstrap is None
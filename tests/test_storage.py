@@ -0,0 +1,61 @@
+import os
+import sys
+import threading
+from storage import RECORD_HEADER, BlockStore, LazyChain
+
+def make_store(tmp_path, count):
+    store = BlockStore(str(tmp_path / "chain.dat"))
+    for i in range(count):
+        store.append(f"block {i}".encode())
+    return store
+
+def test_lazy_chain_concurrent_readers(tmp_path):
+    chain = LazyChain(make_store(tmp_path, 32), bytes, bytes, cache_size=4)
+    interval = sys.getswitchinterval()
+    errors = []
+    
+    def read(offset):
+        try:
+            for n in range(5000):
+                i = (n + offset) % 8
+                assert chain[i] == f"block {i}".encode()
+        except Exception as e:
+            errors.append(e)
+    
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=read, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors
+    assert len(chain.cache) <= 4
+    chain.store.close()
+
+def test_torn_record_is_discarded_on_open(tmp_path):
+    store = make_store(tmp_path, 3)
+    size = store.end
+    store.file.write(RECORD_HEADER.pack(100, 0) + b"partial")
+    store.file.flush()
+    store.close()
+    
+    reopened = BlockStore(str(tmp_path / "chain.dat"))
+    assert len(reopened) == 3
+    assert os.path.getsize(tmp_path / "chain.dat") == size
+    reopened.append(b"block 3")
+    assert [bytes(payload) for payload in reopened] == [f"block {i}".encode() for i in range(4)]
+    reopened.close()
+
+def test_record_with_a_bad_checksum_is_discarded(tmp_path):
+    store = make_store(tmp_path, 3)
+    store.close()
+    with open(tmp_path / "chain.dat", "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"X")
+    
+    reopened = BlockStore(str(tmp_path / "chain.dat"))
+    assert [bytes(payload) for payload in reopened] == [b"block 0", b"block 1"]
+    reopened.close()
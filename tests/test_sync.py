@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import config
+import sync
+from blockchain import Blockchain
+from snapshot import Snapshot
+from conftest import make_block, reward
+
+# Serves a second chain the way node.py's routes do.
+class ChainTransport:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def get_json(self, peer, path, params=None):
+        if path == "/snapshot":
+            return self.chain.snapshot.to_dict()
+        locator = [(int(height), block_hash) for height, block_hash in
+                   (item.split(":", 1) for item in params["locator"].split(","))]
+        start = self.chain.find_fork_point(locator) + 1
+        end = min(start + params["limit"], len(self.chain.chain))
+        return {"start": start, "headers": [self.chain.chain[i].header_dict() for i in range(start, end)]}
+
+    def stream_frames(self, peer, path, params):
+        for i in range(params["from"], params["from"] + params["limit"]):
+            yield self.chain.chain[i].to_bytes()
+
+@pytest.fixture
+def peer_chain(blockchain, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BLOCKS_FILE", str(tmp_path / "peer.dat"))
+    monkeypatch.setattr(config, "TX_INDEX_FILE", str(tmp_path / "peer.db"))
+    monkeypatch.setattr(config, "SNAPSHOT_FILE", str(tmp_path / "peer.json"))
+    monkeypatch.setattr(config, "SYNC_HEADERS_LIMIT", 10)
+    monkeypatch.setattr(config, "SYNC_RANGE_SIZE", 4)
+    chain = Blockchain()
+    chain.mining_workers = 1
+    yield chain
+    chain.tx_index.close()
+
+def extend(chain, count, miner):
+    for _ in range(count):
+        assert chain.add_block(make_block(chain, [reward(miner)]))
+
+def sync_recording(blockchain, peer_chain, monkeypatch):
+    calls = []
+    reorganize = blockchain.reorganize
+
+    def recording(start, blocks):
+        calls.append((start, len(blocks)))
+        return reorganize(start, blocks)
+
+    monkeypatch.setattr(blockchain, "reorganize", recording)
+    tip = {"height": len(peer_chain.chain) - 1, "bodies_from": 0}
+    with ThreadPoolExecutor(2) as pool:
+        assert sync.sync_from_peer(blockchain, ChainTransport(peer_chain), "peer", tip, pool)
+    return calls
+
+def test_fresh_node_applies_ranges_as_they_arrive(blockchain, peer_chain, monkeypatch):
+    extend(peer_chain, 25, "peer")
+    calls = sync_recording(blockchain, peer_chain, monkeypatch)
+    # Header batches of 10, each fetched in ranges of up to 4.
+    assert calls == [(1, 4), (5, 4), (9, 2), (11, 4), (15, 4), (19, 2), (21, 4), (25, 1)]
+    assert blockchain.tip.block.hash == peer_chain.tip.block.hash
+    assert blockchain.get_balance("peer") == 250
+
+def test_fork_switches_once_it_outweighs_our_branch(blockchain, peer_chain, monkeypatch):
+    extend(blockchain, 3, "ours")
+    extend(peer_chain, 25, "peer")
+    calls = sync_recording(blockchain, peer_chain, monkeypatch)
+    assert calls[0] == (1, 10)
+    assert all(count <= 4 for _, count in calls[1:])
+    assert blockchain.tip.block.hash == peer_chain.tip.block.hash
+    assert blockchain.get_balance("ours") == 0
+
+def test_bootstrap_checks_the_snapshot_against_headers(blockchain, peer_chain):
+    extend(peer_chain, 12, "peer")
+    peer_chain.take_snapshot()
+    assert sync.bootstrap_from_peer(blockchain, ChainTransport(peer_chain), "peer")
+    assert blockchain.bootstrap.height == 12
+
+    # A well-formed snapshot of a block that is not on the header chain.
+    peer_chain.snapshot = Snapshot(12, "0" * 64, {"peer": 120})
+    blockchain.bootstrap = None
+    assert not sync.bootstrap_from_peer(blockchain, ChainTransport(peer_chain), "peer")
@@ -0,0 +1,35 @@
+import sqlite3
+import pytest
+import config
+from blockchain import Blockchain
+from conftest import CHAIN_JSON
+
+@pytest.fixture
+def migrated(blockchain, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CHAIN_FILE", CHAIN_JSON)
+    monkeypatch.setattr(config, "BLOCKS_FILE", str(tmp_path / "migrated.dat"))
+    monkeypatch.setattr(config, "TX_INDEX_FILE", str(tmp_path / "migrated.db"))
+    chain = Blockchain()
+    yield chain
+    chain.tx_index.close()
+
+# The legacy chain.json holds a second block with index 12 at position 14.
+def test_index_is_keyed_by_chain_position(migrated):
+    assert migrated.chain[14].index == 12
+    assert len(migrated.tx_index) == len(migrated.chain) == 21
+    for height in (12, 14):
+        block = migrated.chain[height]
+        found, _ = migrated.tx_index.find_transaction(block.transaction[-1].txid, 10)
+        assert (height, block.hash) in {(row["block_index"], row["block_hash"]) for row in found}
+
+def test_index_keyed_by_block_index_is_rebuilt(migrated):
+    migrated.tx_index.close()
+    db = sqlite3.connect(config.TX_INDEX_FILE)
+    with db:
+        db.execute("DELETE FROM blocks WHERE height = 14")
+    db.close()
+    
+    reopened = Blockchain()
+    assert len(reopened.tx_index) == 21
+    assert reopened.tx_index.block_hash(14) == reopened.chain[14].hash
+    reopened.tx_index.close()
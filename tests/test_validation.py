@@ -0,0 +1,155 @@
+import time
+import pytest
+import config
+import validation
+from blockchain import Block, difficulty_target, retarget
+from transaction import Transaction
+from conftest import make_block, make_wallet, reward, signed
+
+def check_structure(block):
+    validation.check_structure(block, config.MAX_BLOCK_TXS, config.MAX_BLOCK_BYTES)
+
+def test_structure_accepts_a_plain_block(blockchain):
+    check_structure(make_block(blockchain, [reward("miner")]))
+
+@pytest.mark.parametrize("txs, reason", [
+    ([], "no transactions"),
+    ([reward("a"), reward("b")], "exactly one reward"),
+    ([Transaction("a", "b", 5)], "exactly one reward"),
+    ([reward("a"), Transaction("a", "b", -5)], "Invalid amount"),
+    ([reward("a"), Transaction("a", "b", True)], "Invalid amount"),
+    ([reward("a"), Transaction("a", "b", 5, fee=-1)], "Invalid amount"),
+    ([reward("a"), Transaction("a", "b", 5), Transaction("a", "b", 5)], "Duplicate"),
+])
+def test_structure_rejects(blockchain, txs, reason):
+    block = Block(1, blockchain.chain[0].timestamp + 1, txs, blockchain.chain[0].hash)
+    with pytest.raises(ValueError, match=reason):
+        check_structure(block)
+
+def test_structure_rejects_too_many_transactions(blockchain, monkeypatch):
+    block = make_block(blockchain, [reward("a"), Transaction("a", "b", 1), Transaction("a", "b", 2)])
+    with pytest.raises(ValueError, match="Too many"):
+        validation.check_structure(block, 2, config.MAX_BLOCK_BYTES)
+    with pytest.raises(ValueError, match="too large"):
+        validation.check_structure(block, config.MAX_BLOCK_TXS, 10)
+
+def test_header_checks(blockchain):
+    genesis = blockchain.chain[0]
+    window = blockchain.retarget_window(1)
+    block = make_block(blockchain, [reward("miner")])
+    validation.check_header(block, genesis, window)
+    
+    unlinked = make_block(blockchain, [reward("miner")])
+    unlinked.previous_hash = "0" * 64
+    with pytest.raises(ValueError, match="link"):
+        validation.check_header(unlinked, genesis, window)
+    
+    tampered = make_block(blockchain, [reward("miner")])
+    tampered.transaction[0].recipient = "thief"
+    tampered._merkle_root = None
+    with pytest.raises(ValueError):
+        validation.check_header(tampered, genesis, window)
+
+def test_signatures(blockchain):
+    key, sender = make_wallet()
+    tx = signed(key, sender, "b", 5)
+    block = make_block(blockchain, [tx, reward("miner")])
+    validation.check_signatures(block)
+    tx.amount = 50
+    with pytest.raises(ValueError, match="signature"):
+        validation.check_signatures(block)
+
+def test_balances(blockchain):
+    key, sender = make_wallet()
+    ledger = blockchain.ledger
+    poor = make_block(blockchain, [signed(key, sender, "b", 5), reward("miner")])
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        validation.check_balances(poor, ledger, blockchain.mining_reward)
+    
+    greedy = make_block(blockchain, [reward("miner", blockchain.mining_reward + 1)])
+    with pytest.raises(ValueError, match="Reward exceeds"):
+        validation.check_balances(greedy, ledger, blockchain.mining_reward)
+
+def test_balances_without_reward_raise_value_error(blockchain):
+    block = Block(1, blockchain.chain[0].timestamp + 1, [Transaction("a", "b", 0)], blockchain.chain[0].hash)
+    with pytest.raises(ValueError, match="reward"):
+        validation.check_balances(block, blockchain.ledger, blockchain.mining_reward)
+
+def extend(blockchain, count, recipient):
+    blocks = []
+    for _ in range(count):
+        block = make_block(blockchain, [reward(recipient)], blocks[-1] if blocks else blockchain.chain[0])
+        blocks.append(block)
+    return blocks
+
+def test_reorganize_checks_structure(blockchain):
+    key, signer = make_wallet()
+    _, victim = make_wallet()
+    for block in extend(blockchain, 2, victim):
+        assert blockchain.add_block(block)
+    
+    # A signed negative transfer with a second reward to cover it.
+    theft = signed(key, signer, victim, -20)
+    fork = extend(blockchain, 2, "miner")
+    fork.append(make_block(blockchain, [theft, reward("miner"), reward(signer, 20)], fork[-1]))
+    with pytest.raises(ValueError):
+        blockchain.reorganize(1, fork)
+    assert len(blockchain.chain) == 3
+    assert blockchain.get_balance(victim) == 20
+    assert blockchain.get_balance(signer) == 0
+
+def test_reorganize_restores_the_chain_when_a_block_fails(blockchain):
+    key, sender = make_wallet()
+    old = extend(blockchain, 2, "miner")
+    for block in old:
+        assert blockchain.add_block(block)
+    
+    fork = extend(blockchain, 2, "other")
+    fork.append(make_block(blockchain, [signed(key, sender, "b", 5), reward("other")], fork[-1]))
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        blockchain.reorganize(1, fork)
+    assert [block.hash for block in blockchain.chain[1:]] == [block.hash for block in old]
+    assert blockchain.tip.height == 2
+    assert blockchain.get_balance("miner") == 20
+
+def test_mempool_rejects_invalid_amounts(blockchain):
+    key, sender = make_wallet()
+    blockchain.add_block(make_block(blockchain, [reward(sender)]))
+    for amount, fee in [(-5, 0), (True, 0), (5, -1), (5, True)]:
+        with pytest.raises(ValueError, match="Invalid amount"):
+            blockchain.add_transaction(signed(key, sender, "b", amount, fee))
+    blockchain.add_transaction(signed(key, sender, "b", 5, 1))
+    assert len(blockchain.mempool) == 1
+
+def test_header_timestamps(blockchain):
+    genesis = blockchain.chain[0]
+    window = blockchain.retarget_window(1)
+    for timestamp in [0.0, genesis.timestamp, time.time() + config.MAX_FUTURE_DRIFT + 60, "1"]:
+        block = Block(1, timestamp, [reward("miner")], genesis.hash, target=blockchain.next_target())
+        blockchain.proof_of_work(block, 1)
+        with pytest.raises(ValueError, match="header"):
+            validation.check_header(block, genesis, window)
+
+def test_timestamps_must_pass_the_median(blockchain):
+    for block in extend(blockchain, 3, "miner"):
+        assert blockchain.add_block(block)
+    parent = blockchain.chain[-1]
+    median = blockchain.chain[2].timestamp
+    for timestamp, accepted in [(median, False), (median + 0.5, True)]:
+        block = Block(parent.index + 1, timestamp, [reward("miner")], parent.hash, target=blockchain.next_target())
+        blockchain.proof_of_work(block, 1)
+        if accepted:
+            assert blockchain.add_block(block)
+        else:
+            with pytest.raises(ValueError, match="header"):
+                blockchain.add_block(block)
+
+def test_retarget_clamps_each_interval(monkeypatch):
+    monkeypatch.setattr(config, "TARGET_BLOCK_TIME", 60)
+    target = difficulty_target(4)
+    # A day-long gap, then 20 blocks on time: the gap counts as 6 blocks.
+    window = [(0.0, target)] + [(86400.0 + 60 * i, target) for i in range(20)]
+    assert retarget(window) == target * (25 * 60000) // (20 * 60000)
+    
+    window = [(60.0 * i, target) for i in range(21)]
+    assert retarget(window) == target
@@ -1,49 +1,211 @@
 import json
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from cryptography.hazmat.primitives.asymmetric.ed25519 import (
     Ed25519PrivateKey, Ed25519PublicKey
 )
 from cryptography.exceptions import InvalidSignature
+import config
+import metrics
+
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+_verify_executor = None
+
+@lru_cache(maxsize=4096)
+def load_public_key(address):
+    return Ed25519PublicKey.from_public_bytes(base64.b64decode(address))
+
+def _remember_verified(key):
+    with _verified_lock:
+        _verified[key] = True
+        if len(_verified) > config.SIGNATURE_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+def clear_verified_cache():
+    with _verified_lock:
+        _verified.clear()
+
+def _is_verified(key):
+    with _verified_lock:
+        if key in _verified:
+            _verified.move_to_end(key)
+            return True
+    return False
+
+# The cryptography library releases the GIL while verifying, so a thread
+# pool is enough to spread a block's or a mempool's signatures over cores.
+def verify_batch(transactions):
+    global _verify_executor
+    results = [None] * len(transactions)
+    todo = []
+    for i, tx in enumerate(transactions):
+        if tx.sender == "SYSTEM" or not tx.signature:
+            results[i] = tx.sender == "SYSTEM"
+        elif _is_verified(tx.verification_key()):
+            results[i] = True
+        else:
+            todo.append(i)
+            
+    if len(todo) > 1 and config.SIGNATURE_WORKERS > 1:
+        if _verify_executor is None:
+            _verify_executor = ThreadPoolExecutor(config.SIGNATURE_WORKERS)
+        for i, valid in zip(todo, _verify_executor.map(lambda i: transactions[i].is_valid(), todo)):
+            results[i] = valid
+    else:
+        for i in todo:
+            results[i] = transactions[i].is_valid()
+    return results
+
+# Merkle tree over transaction ids. An odd node at the end of a level is
+# carried up unchanged, and inner nodes are prefixed with 0x01 so they can
+# never be confused with a leaf.
+def merkle_parent(left, right):
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+def merkle_levels(leaves):
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [merkle_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+def merkle_root(leaves):
+    if not leaves:
+        return hashlib.sha256(b"").hexdigest()
+    return merkle_levels(leaves)[-1][0]
+
+def merkle_proof(leaves, index):
+    proof = []
+    for level in merkle_levels(leaves)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                "hash": level[sibling],
+                "position": "left" if sibling < index else "right"
+            })
+        index //= 2
+    return proof
+
+def verify_merkle_proof(txid, proof, root):
+    current = txid
+    try:
+        for step in proof:
+            if step["position"] == "left":
+                current = merkle_parent(step["hash"], current)
+            else:
+                current = merkle_parent(current, step["hash"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return current == root
+
+# Keys and signatures are held as raw bytes when they are canonical base64
+# of the expected size, and as the original string otherwise ("SYSTEM",
+# hand-written recipients), so reading a field always gives back its input.
+def pack_b64(value, size):
+    if not isinstance(value, str) or len(value) != 4 * ((size + 2) // 3):
+        return value
+    try:
+        raw = base64.b64decode(value, validate=True)
+    except ValueError:
+        return value
+    return raw if len(raw) == size and base64.b64encode(raw).decode() == value else value
+
+def unpack_b64(value):
+    return base64.b64encode(value).decode() if isinstance(value, bytes) else value
+
+class Field:
+    def __init__(self, slot, size=None):
+        self.slot = slot
+        self.size = size
+        
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        return unpack_b64(value) if self.size else value
+    
+    # Any change to a field invalidates the cached txid.
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, pack_b64(value, self.size) if self.size else value)
+        obj._txid = None
 
 class Transaction:
-    def __init__(self, sender, recipient, amount, signature=None):
+    __slots__ = ("_sender", "_recipient", "_amount", "_signature", "_fee", "_txid")
+    
+    sender = Field("_sender", 32)
+    recipient = Field("_recipient", 32)
+    amount = Field("_amount")
+    signature = Field("_signature", 64)
+    fee = Field("_fee")
+    
+    def __init__(self, sender, recipient, amount, signature=None, fee=0):
         self.sender = sender
         self.recipient = recipient
         self.amount = amount
         self.signature = signature
+        self.fee = fee
         
+    # The fee is only serialized when set, so transactions signed before
+    # fees existed keep the same message and still verify.
     def to_dict(self):
-        return {
+        data = {
             'sender': self.sender,
             'recipient': self.recipient,
             'amount': self.amount
         }
+        if self.fee:
+            data['fee'] = self.fee
+        return data
+        
+    def to_signed_dict(self):
+        return dict(self.to_dict(), signature=self.signature)
         
     def to_json(self):
         return json.dumps(self.to_dict(), sort_keys=True)
     
+    @property
+    def txid(self):
+        if self._txid is None:
+            self._txid = hashlib.sha256(json.dumps(self.to_signed_dict(), sort_keys=True).encode()).hexdigest()
+        return self._txid
+    
+    def verification_key(self):
+        return hashlib.sha256(self.to_json().encode()).digest(), self.signature
+    
     def sign(self, private_key: Ed25519PrivateKey):
         message = self.to_json().encode()
         signature = private_key.sign(message)
         self.signature = base64.b64encode(signature).decode()
         
+    @metrics.timed(metrics.TX_VERIFY_SECONDS)
     def is_valid(self):
         if self.sender == "SYSTEM":
              return True
         if not self.signature:
             return False
         
+        key = self.verification_key()
+        if _is_verified(key):
+            return True
+        
         try:
-            public_key = Ed25519PublicKey.from_public_bytes(
-                base64.b64decode(self.sender)
-            )
+            public_key = load_public_key(self.sender)
             public_key.verify(
                 base64.b64decode(self.signature),
                 self.to_json().encode()
             )
-            return True
         except (InvalidSignature, ValueError, TypeError):
             return False
+        _remember_verified(key)
+        return True
         
     def __repr__(self):
         return f"<Tx {self.sender[:6]} -> {self.recipient[:6]}: {self.amount}>"
@@ -54,6 +216,7 @@ class Transaction:
             f"  From: {self.sender}\n"
             f"  To: {self.recipient}\n"
             f"  Amount: {self.amount}\n"
+            f"  Fee: {self.fee}\n"
             f"  Signature: {self.signature}\n"
             f"  Valid: {self.is_valid()}"
         )
\ No newline at end of file
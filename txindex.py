@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    height INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    work TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    height INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    txid TEXT NOT NULL,
+    sender TEXT,
+    recipient TEXT,
+    amount,
+    fee,
+    PRIMARY KEY (height, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS transactions_txid ON transactions (txid, height, position);
+CREATE TABLE IF NOT EXISTS addresses (
+    address TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (address, height, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS addresses_height ON addresses (height);
+"""
+
+# Amounts and fees have no column type, so ints and floats come back as
+# they went in.
+COLUMNS = "t.height, t.position, t.txid, t.sender, t.recipient, t.amount, t.fee, b.hash"
+
+def row_to_dict(row):
+    height, position, txid, sender, recipient, amount, fee, block_hash = row
+    return {
+        "txid": txid,
+        "block_index": height,
+        "block_hash": block_hash,
+        "position": position,
+        "sender": sender,
+        "recipient": recipient,
+        "amount": amount,
+        "fee": fee
+    }
+
+def parse_cursor(cursor):
+    height, position = cursor.split(":", 1)
+    return int(height), int(position)
+
+# Secondary index over the chain in SQLite: where each transaction sits,
+# the transactions each address sent or received, and the cumulative work
+# up to each block, so opening the chain does not decode every block. Txids are not unique
+# (identical rewards and replayed transfers share one), so both lookups
+# return pages of (height, position) ordered newest first; the cursor of
+# the next page is "height:position" of the last row returned.
+class TxIndex:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(blocks)")]
+        if columns and "work" not in columns:
+            print(f"[i] Rebuilding the index in {path} to add cumulative work")
+            self.db.executescript("DROP TABLE blocks; DROP TABLE transactions; DROP TABLE addresses;")
+        self.db.executescript(SCHEMA)
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    def top_height(self):
+        with self.lock:
+            return self.db.execute("SELECT MAX(height) FROM blocks").fetchone()[0]
+
+    def block_hash(self, height):
+        with self.lock:
+            row = self.db.execute("SELECT hash FROM blocks WHERE height = ?", (height,)).fetchone()
+        return row[0] if row else None
+
+    # Cumulative work is stored as hex, as it does not fit an SQLite integer.
+    def work(self, height):
+        with self.lock:
+            row = self.db.execute("SELECT work FROM blocks WHERE height = ?", (height,)).fetchone()
+        return int(row[0], 16) if row else None
+
+    # Brings the index in line with chain after a restart: blocks past the
+    # last one both agree on are dropped, and the rest are indexed, with
+    # block_work giving the work each adds. Pruned blocks no longer have
+    # transactions to index. Rows are keyed by position in the chain, as
+    # the legacy chain.json repeats a block index; an index keyed by
+    # block.index has a gap there and is rebuilt.
+    def catch_up(self, chain, block_work):
+        if len(self) and self.top_height() != len(self) - 1:
+            print("[i] Rebuilding the transaction index by chain position")
+            self.truncate(0)
+        height = min(len(self), len(chain))
+        while height > 0 and self.block_hash(height - 1) != chain[height - 1].hash:
+            height -= 1
+        self.truncate(height)
+        work = self.work(height - 1) or 0
+        skipped = 0
+        for i in range(height, len(chain)):
+            block = chain[i]
+            skipped += block.pruned
+            work += block_work(block)
+            self.add_block(block, i, work)
+        if skipped:
+            print(f"[!] {skipped} pruned blocks could not be indexed")
+
+    def add_block(self, block, height, work):
+        rows = [
+            (height, position, tx.txid, tx.sender, tx.recipient, tx.amount, tx.fee)
+            for position, tx in enumerate(block.transaction)
+        ]
+        addresses = {
+            (address, height, position)
+            for position, tx in enumerate(block.transaction)
+            for address in (tx.sender, tx.recipient)
+        }
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", (height, block.hash, f"{work:x}"))
+            self.db.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("INSERT OR IGNORE INTO addresses VALUES (?, ?, ?)", addresses)
+
+    def truncate(self, length):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM blocks WHERE height >= ?", (length,))
+            self.db.execute("DELETE FROM transactions WHERE height >= ?", (length,))
+            self.db.execute("DELETE FROM addresses WHERE height >= ?", (length,))
+
+    def find_transaction(self, txid, limit, cursor=None):
+        before = parse_cursor(cursor) if cursor else (1 << 62, 0)
+        with self.lock:
+            rows = self.db.execute(f"""
+                SELECT {COLUMNS} FROM transactions t JOIN blocks b ON b.height = t.height
+                WHERE t.txid = ? AND (t.height, t.position) < (?, ?)
+                ORDER BY t.height DESC, t.position DESC LIMIT ?
+            """, (txid, *before, limit)).fetchall()
+        return self.page(rows, limit)
+
+    def address_history(self, address, limit, cursor=None):
+        before = parse_cursor(cursor) if cursor else (1 << 62, 0)
+        with self.lock:
+            rows = self.db.execute(f"""
+                SELECT {COLUMNS} FROM addresses a
+                JOIN transactions t ON t.height = a.height AND t.position = a.position
+                JOIN blocks b ON b.height = t.height
+                WHERE a.address = ? AND (a.height, a.position) < (?, ?)
+                ORDER BY a.height DESC, a.position DESC LIMIT ?
+            """, (address, *before, limit)).fetchall()
+        return self.page(rows, limit)
+
+    def page(self, rows, limit):
+        items = [row_to_dict(row) for row in rows]
+        cursor = f"{rows[-1][0]}:{rows[-1][1]}" if len(rows) == limit else None
+        return items, cursor
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,76 @@
+import blockchain
+from mempool import transaction_size
+from transaction import verify_batch
+
+# Stages of block validation, cheapest first. Each stage raises ValueError
+# with the reason a block is rejected, so an invalid block is turned away
+# before signatures are verified or balances are touched.
+
+def is_amount(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+def check_structure(block, max_txs, max_bytes):
+    if block.pruned:
+        raise ValueError("Block has no body")
+    if not block.transaction:
+        raise ValueError("Block has no transactions")
+    if len(block.transaction) > max_txs:
+        raise ValueError("Too many transactions")
+    if sum(transaction_size(tx) for tx in block.transaction) > max_bytes:
+        raise ValueError("Block is too large")
+    
+    rewards = [tx for tx in block.transaction if tx.sender == "SYSTEM"]
+    if len(rewards) != 1:
+        raise ValueError("Block must have exactly one reward transaction")
+    if not all(is_amount(tx.amount) and is_amount(tx.fee) for tx in block.transaction):
+        raise ValueError("Invalid amount or fee")
+    if len({tx.txid for tx in block.transaction}) != len(block.transaction):
+        raise ValueError("Duplicate transaction")
+
+# Linkage and proof-of-work are checked on the claimed hash before the
+# Merkle root and the hash itself are recomputed.
+def check_header(block, previous, window):
+    if block.index != previous.index + 1 or block.previous_hash != previous.hash:
+        raise ValueError("Block does not link to its parent")
+    if not blockchain.meets_target(block.hash, block.target):
+        raise ValueError("Insufficient proof-of-work")
+    if not blockchain.header_is_valid(block.header_dict(), previous.header_dict(), window):
+        raise ValueError("Invalid block header")
+    if block.hash != block.calculate_hash():
+        raise ValueError("Block hash does not match its contents")
+
+# What can be checked on a block whose parent is unknown: its work against
+# its own target, no easier than max_target, and its hash.
+def check_proof(block, max_target):
+    if block.target > max_target:
+        raise ValueError("Target is easier than the chain allows")
+    if not blockchain.meets_target(block.hash, block.target):
+        raise ValueError("Insufficient proof-of-work")
+    if block.hash != block.calculate_hash():
+        raise ValueError("Block hash does not match its contents")
+
+def check_signatures(block):
+    if not all(verify_batch(block.transaction)):
+        raise ValueError("Invalid signature")
+
+# Applies the block on top of the ledger without changing it: every sender
+# must afford amount plus fee, counting what earlier transactions in the
+# same block paid them, and the reward may not exceed subsidy plus fees.
+def check_balances(block, ledger, mining_reward):
+    changes = {}
+    fees = 0
+    for tx in block.transaction:
+        if tx.sender == "SYSTEM":
+            continue
+        available = ledger.get_balance(tx.sender) + changes.get(tx.sender, 0)
+        if tx.amount + tx.fee > available:
+            raise ValueError("Insufficient funds")
+        changes[tx.sender] = changes.get(tx.sender, 0) - tx.amount - tx.fee
+        changes[tx.recipient] = changes.get(tx.recipient, 0) + tx.amount
+        fees += tx.fee
+        
+    reward = next((tx for tx in block.transaction if tx.sender == "SYSTEM"), None)
+    if reward is None:
+        raise ValueError("Block must have exactly one reward transaction")
+    if reward.amount > mining_reward + fees:
+        raise ValueError("Reward exceeds subsidy plus fees")